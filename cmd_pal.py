@@ -1,18 +1,33 @@
 #!/usr/bin/env python3
 
+import time
+process_started = time.perf_counter()  # taken before the heavy imports for --startup-profile
+
 import configparser
 import sys
 import os
 import subprocess
+import signal
 import re
-from PyQt5.QtCore import QTimer, pyqtSignal, Qt
-from PyQt5.QtWidgets import QApplication, QLabel, QWidget, QVBoxLayout, QGridLayout, QTextEdit, QPushButton, QVBoxLayout, QScrollArea, QHBoxLayout, QSpacerItem, QSizePolicy
+from PyQt5.QtCore import QTimer, pyqtSignal, Qt, QObject, QRunnable, QThreadPool, QAbstractListModel, QModelIndex, QFileSystemWatcher, QEventLoop, QEvent, QThread, QCoreApplication
+from PyQt5.QtWidgets import QApplication, QLabel, QWidget, QVBoxLayout, QTextEdit, QPlainTextEdit, QPushButton, QScrollArea, QHBoxLayout, QSpacerItem, QSizePolicy, QListView, QShortcut, QLineEdit, QListWidget, QListWidgetItem
+from PyQt5.QtGui import QPainter, QColor, QIcon, QTextCursor, QKeySequence
 from functools import partial
 from datetime import datetime, timedelta
 from collections import deque
-from PyQt5.QtCore import Qt, QCoreApplication, QThread
-from PyQt5.QtGui import QPainter, QColor, QIcon
 import base64
+import codecs
+import hashlib
+import random
+import queue
+import selectors
+import shlex
+import threading
+import json
+import heapq
+import itertools
+import difflib
+import zlib
 
 # Styling
 HEADER_STYLE              = "font-size: 26px; text-align:center;font-weight: bold;color: #00cc00;background-color: #121;padding-bottom:4px;margin-bottom:0px;"
@@ -26,6 +41,11 @@ DISPLAY_FIELD_STYLE       = "background-color: #444; color: #fff;font-size:11px;
 STATUS_FIELD_STYLE        = "background-color: #121; color: #00cc00"
 HOVER_BUTTON_STYLE        = "font-size: 14px;padding-top: 3px; padding-bottom: 3px; margin:0px;padding-left:3px; margin-top: -3px; margin-bottom: -3px;text-align: left;background: #666"
 SCROLL_AREA_STYLE         = "QScrollArea {border: 1px solid #666;padding:0px;margin: 0px;} QScrollBar {border: none;}"
+LIST_VIEW_STYLE           = "QListView {border: 1px solid #666;padding:0px;margin: 0px;font-size: 14px;} QListView::item {background: #666;padding: 3px;margin-bottom: 1px;} QListView::item:hover {background: #777;}"
+SEARCH_FIELD_STYLE        = "background-color: #222; color: #8d8;font-size:13px;padding:4px;border: 1px solid #262;"
+SEARCH_RESULTS_STYLE      = "QListWidget {background-color: #222; color: #fff;font-size:12px;border: 1px solid #262;} QListWidget::item:hover {background: #363;}"
+JOBS_LIST_STYLE           = "QListWidget {background-color: #121; color: #8d8;font-size:11px;border: 1px solid #262;} QListWidget::item:hover {background: #522;}"
+METRICS_OVERLAY_STYLE     = "background-color: rgba(0, 0, 0, 210); color: #8d8; font-family: Menlo, monospace; font-size: 10px; padding: 3px;"
 OUTPUT_STYLE              = "QScrollArea {border: 1px solid #666;padding:0px;margin: 0px;} QScrollBar {border: none;}"
 
 # Settings
@@ -35,6 +55,54 @@ CUSTOM_TEXT_EDIT_HEIGHT       = 35
 CUSTOM_TEXT_EDIT_FOCUS_HEIGHT = 100
 SCROLL_AREA_FIXED_HEIGHT      = 100
 BACKGROUNDED_LABEL_SIZE       = 30
+MAX_COMMAND_WORKERS           = 4
+SHELL_WORKERS                 = 2     # long-lived shells kept warm by --persistent-shell
+DEFAULT_COMMAND_TIMEOUT       = 30
+DEFAULT_LOG_TAIL_KB           = 64
+DEFAULT_HISTORY_LIMIT         = 50
+HISTORY_READ_BLOCK_SIZE       = 65536
+ADAPTIVE_MAX_INTERVAL_FACTOR  = 8
+SCHEDULER_COALESCE_WINDOW     = 0.5   # seconds; sections due this close together refresh in one batch
+SCHEDULER_JITTER              = 0.1   # up to this fraction of an interval is added at random
+SCHEDULER_RETRY_DELAY         = 0.25  # seconds to wait when the concurrency cap is reached
+MAX_CONCURRENT_REFRESHES      = 4
+BACKGROUND_INTERVAL_FACTOR    = 4     # intervals are multiplied by this while collapsed; 0 suspends refreshes
+METRICS_HISTORY               = 32    # refresh samples kept per section
+METRICS_EXPORT_INTERVAL       = 10    # seconds between metrics file writes
+METRICS_OVERLAY_SHORTCUT      = "Ctrl+Shift+M"
+SEARCH_SHORTCUT               = "Ctrl+F"
+SEARCH_RESULT_LIMIT           = 50
+SEARCH_RESULTS_HEIGHT         = 200
+SEARCH_INDEXED_CHARS          = 256   # only the start of very long entries is indexed
+SEARCH_SCORE_LIMIT            = 500   # at most this many of the newest candidates are ranked
+SEARCH_FUZZY_SCAN_LIMIT       = 5000  # newest entries checked for subsequence matches
+SEARCH_INDEX_CHUNK            = 500   # entries indexed per event loop turn when a section loads many at once
+STORE_FLUSH_INTERVAL          = 2     # seconds between batched writes to the command store
+STORE_MAX_ITEMS_PER_SECTION   = 5000
+STORE_MAX_ITEMS               = 50000
+STORE_SEEN_REFRESH            = 60    # seconds between last_seen updates of an entry still in the output
+FRECENCY_HALF_LIFE            = 7 * 24 * 3600  # seconds for an entry's recency weight to halve
+DEFAULT_FRECENT_LIMIT         = 50
+STARTUP_POLL_STAGGER          = 0.1   # seconds between the first polls of consecutive sections
+STARTUP_SEEDED_POLL_DELAY     = 1     # extra delay before the first poll of a section seeded from the snapshot
+SNAPSHOT_MAX_BYTES            = 262144  # larger outputs are not kept in the startup snapshot
+CONFIG_RELOAD_DELAY           = 300   # ms to wait for an editor to finish writing a config
+MAX_RUN_JOBS                  = 4     # `run` actions running at once, the rest wait in a queue
+RUN_READ_CHUNK                = 65536
+RUN_OUTPUT_FLUSH_INTERVAL     = 100   # ms between batched appends to the status field
+RUN_OUTPUT_MAX_PENDING        = 262144  # characters buffered between flushes, older ones are dropped
+RUN_OUTPUT_MAX_LINES          = 2000  # lines kept in the status field
+RUN_OUTPUT_MAX_CHARS          = 1000000  # characters kept in the status field, for output without newlines
+RUN_KILL_DELAY                = 3     # seconds between SIGTERM and SIGKILL when stopping a job
+JOBS_LIST_HEIGHT              = 60
+DEFAULT_CLIPBOARD_ITEMS       = 50
+DEFAULT_CLIPBOARD_MAX_KB      = 4096
+CLIPBOARD_COMPRESS_BYTES      = 4096  # larger clipboard values are kept zlib-compressed
+CLIPBOARD_PREVIEW_CHARS       = 2000  # characters of a clipboard value shown on hover
+DEFAULT_DISPLAY_MAX_CHARS     = 200000
+DEFAULT_DISPLAY_SCROLLBACK    = 1000
+DISPLAY_PATCH_MAX_OPS         = 64    # above this many changed regions a display is re-set instead of patched
+DAEMON_RECONNECT_INTERVAL     = 2     # seconds between attempts to reach the daemon from --attach
 
 DEFAULT_CONFIG = """
 # CMD_PAL Configuration File
@@ -43,15 +111,30 @@ DEFAULT_CONFIG = """
 # Each section represents a different widget in the CMD_PAL interface.
 #
 # Available options for each section:
-#   type (required): The type of widget to display. Options are 'log', 'parse_command', and 'display'.
+#   type (required): The type of widget to display. Options are 'log', 'parse_command', 'history', 'clipboard' and 'display'.
 #
 #   value (required): The value associated with the widget type.
 #     - For 'log': The file path for the log file (e.g., '~/my_log.txt').
 #     - For 'parse_command': The command to be executed and parsed (e.g., 'ls -la').
+#     - For 'history': The shell history file to read (e.g., '~/.zsh_history').
 #     - For 'display': The command to be executed and displayed (e.g., 'date').
 #
 #   interval (required): The time interval (in seconds) between updates for the widget.
 #
+#   timeout (optional, default=30): For 'parse_command' and 'display', the number of seconds
+#     a command may run before it is killed. A section never starts a new run while one is in flight.
+#   cwd (optional): For 'parse_command' and 'display', the directory the command runs in. Sections
+#     running the same command in the same directory share one execution and its result.
+#
+#   adaptive (optional, default=False): For 'parse_command', 'history' and 'display', double the
+#     interval each time the output is unchanged, and snap back to 'interval' when it changes or the
+#     window gains focus.
+#   max_interval (optional, default=8 x interval): The longest interval an adaptive section backs off to.
+#
+# Additional options specific to 'log' type:
+#   tail_kb (optional, default=64): Only the last this many KB are loaded at startup; scrolling to
+#     the top loads earlier pages. The file is watched and only newly appended bytes are read.
+#
 # Additional options specific to 'parse_command' type:
 #   clean (optional, default=False): If set to True, the widget will remove old entries before updating.
 #   split (optional, default=False): If set to True, the output of the command will be split by newline characters.
@@ -59,35 +142,56 @@ DEFAULT_CONFIG = """
 #     - 'insert': Switches to the last app frontmost and inserts the text
 #     - 'show': Shows the command in a terminal window (new or existing)
 #     - 'run': Runs the command internally and displays the output in the bottom status field.
+#   view (optional, default='buttons'): How entries are rendered.
+#     - 'buttons': One button per entry.
+#     - 'list': A virtualized list that only paints visible rows; use it for commands with thousands of lines.
+#   max_items (optional, default=0): Keep at most this many entries, evicting the oldest first. 0 means no limit.
+#   store (optional, default=False): Remember every entry seen or clicked in ~/.cmd_pal/store.sqlite3,
+#     across restarts and across configs with the same section name.
+#   order (optional, default='output'): 'frecent' shows the stored entries ranked by how often and how
+#     recently they were used or seen (requires store = True), up to max_items or 50 entries.
 #
 #   When using the parse_command type, you can assign custom labels to buttons with 
 #   lines like "ls -lah ;: My ls" to create a [My ls] button.
+#
+# Additional options specific to 'history' type (clean, action, view and max_items also apply):
+#   limit (optional, default=50): The number of most recent entries to show.
+#   format (optional, default='auto'): 'zsh', 'bash', 'pry' or 'auto' to guess from the file.
+#     The file is read in-process and only re-read when its size or modification time changes.
+#
+# The 'clipboard' type needs no value. It follows the system clipboard without spawning a process,
+# reacting to change notifications and checking every 'interval' seconds while in the background.
+#   action (optional, default='insert'): As for parse_command.
+#   max_items (optional, default=50): The number of distinct clipboard values to keep.
+#   max_kb (optional, default=4096): The total size of kept values; large values are stored compressed.
+#
+# Additional options specific to 'display' type:
+#   renderer (optional, default='rich'): 'plain' uses a lighter plain-text widget.
+#   max_chars (optional, default=200000): Output beyond this many characters is truncated. 0 means no limit.
+#   mode (optional, default='replace'): 'append' adds the lines that are new since the previous output.
+#   scrollback (optional, default=1000): With mode = append, the number of lines kept.
 
 # Default config assumes zsh shell but you can customize it to be whatever
 [History]
-type = parse_command
-# history in zsh is stored like ": 1687218706:0;ls" so we cleanup.
-value = tail -n 50 ~/.zsh_history | cut -d ";" -f2- -s
+type = history
+value = ~/.zsh_history
 interval = 4
 clean = True
-split = True
 action = show
+store = True
 
 
 [Clipboard]
-type = parse_command
-value = pbpaste
+type = clipboard
 interval = 4
-clean = False
-split = False
 action = insert
 
 [Ruby Shell]
-type = parse_command
-value = tail -n 50 ~/.pry_history
+type = history
+value = ~/.pry_history
+format = pry
 interval = 4
 clean = True
-split = True
 action = insert
 
 [notes.txt]
@@ -103,17 +207,1180 @@ interval = 10
 
 # Classes
 
+# runs one `run` action in its own process group and streams its output back as it arrives
 class CommandThread(QThread):
-    result_signal = pyqtSignal(str)
+    output_signal = pyqtSignal(str)
+
+    def __init__(self, command):
+        super().__init__()
+        self.command = command
+        self.process = None
+        self.stopping = False
+        self.returncode = None
 
-    def __init__(self, command, action):
+    def run(self):
+        started = time.perf_counter()
+        received = 0
+        count_process_spawn()
+        self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, shell=True, start_new_session=True)
+        if self.stopping:
+            self.signal(signal.SIGKILL)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            chunk = self.process.stdout.read1(RUN_READ_CHUNK)
+            if not chunk:
+                break
+            received += len(chunk)
+            self.output_signal.emit(decoder.decode(chunk))
+        self.output_signal.emit(decoder.decode(b'', final=True))
+        self.returncode = self.process.wait()
+        get_metrics("run").record(command=time.perf_counter() - started, bytes=received)
+
+    def signal(self, signum):
+        try:
+            os.killpg(self.process.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    # first asks the job to terminate, then kills its whole process group
+    def stop(self):
+        if self.process is None:
+            self.stopping = True
+            QTimer.singleShot(RUN_KILL_DELAY * 1000, self.kill)
+        elif not self.stopping:
+            self.stopping = True
+            self.signal(signal.SIGTERM)
+            QTimer.singleShot(RUN_KILL_DELAY * 1000, self.kill)
+        else:
+            self.kill()
+
+    def kill(self):
+        if self.isRunning() and self.process is not None:
+            self.signal(signal.SIGKILL)
+
+class CommandTask(QRunnable):
+    def __init__(self, executor, key, command, timeout, cwd=None):
         super().__init__()
+        self.executor = executor
+        self.key = key
         self.command = command
-        self.action = action
+        self.timeout = timeout
+        self.cwd = cwd
 
     def run(self):
-        result = execute_command_in_parent_terminal(self.command, self.action)
-        self.result_signal.emit(result)
+        self.started = time.perf_counter()
+        try:
+            result = run_shell_command(self.command, self.timeout, self.cwd)
+            self.emit(result.stdout, "")
+        except subprocess.TimeoutExpired:
+            self.emit("", "timed out after {}s".format(self.timeout))
+        except Exception as e:
+            self.emit("", str(e))
+
+    def emit(self, output, error):
+        try:
+            self.executor.result_ready.emit(self.key, output, error, time.perf_counter() - self.started)
+        except RuntimeError:
+            pass  # executor was destroyed while the app was shutting down
+
+# cached output of one (command, cwd) and the sections that have already been handed it
+class CachedResult:
+    def __init__(self, output, finished):
+        self.output = output
+        self.finished = finished
+        self.delivered = set()
+
+# runs section commands on a bounded pool and hands results back on the GUI thread.
+# Sections polling the same command in the same directory share one execution: requests
+# made while it runs wait for it, and requests within the shortest subscriber interval
+# after it finished get its cached output.
+class SectionExecutor(QObject):
+    result_ready = pyqtSignal(object, str, str, float)
+
+    def __init__(self, max_workers=MAX_COMMAND_WORKERS):
+        super().__init__()
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.in_flight = {}
+        self.waiting = {}
+        self.results = {}
+        self.subscribers = {}
+        self.cache_hits = 0
+        self.result_ready.connect(self.deliver)
+
+    def submit(self, key, command, timeout, callback, cwd=None, interval=0):
+        if key in self.in_flight:
+            return False
+        command_key = (command, cwd)
+        subscribers = self.subscribers.setdefault(command_key, {})
+        subscribers[key] = interval
+        cached = self.results.get(command_key)
+        # a section is only handed a cached result it has not seen yet, so it never skips a refresh
+        if cached is not None and key not in cached.delivered and time.monotonic() - cached.finished < min(subscribers.values()):
+            cached.delivered.add(key)
+            self.cache_hits += 1
+            callback(cached.output, "", 0.0)
+            return True
+        self.in_flight[key] = callback
+        waiting = self.waiting.get(command_key)
+        if waiting is None:
+            waiting = self.waiting[command_key] = []
+            self.pool.start(CommandTask(self, command_key, command, timeout, cwd))
+        waiting.append(key)
+        return True
+
+    def cancel(self, key):
+        # a running worker cannot be interrupted, so its result is dropped when it arrives
+        if key in self.in_flight:
+            self.in_flight[key] = lambda output, error, elapsed: None
+        for command_key, subscribers in list(self.subscribers.items()):
+            subscribers.pop(key, None)
+            if not subscribers:
+                del self.subscribers[command_key]
+                self.results.pop(command_key, None)
+
+    def deliver(self, command_key, output, error, elapsed):
+        keys = self.waiting.pop(command_key, [])
+        if error:
+            self.results.pop(command_key, None)
+        else:
+            cached = self.results[command_key] = CachedResult(output, time.monotonic())
+            cached.delivered.update(keys)
+        for key in keys:
+            callback = self.in_flight.pop(key, None)
+            if callback is not None:
+                callback(output, error, elapsed)
+
+class SectionListModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.items = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self.items[index.row()]
+        if role == Qt.DisplayRole:
+            return button_label(item)
+        if role in (Qt.UserRole, Qt.ToolTipRole):
+            return item
+        return None
+
+    # only the rows between the unchanged prefix and suffix are removed and inserted
+    def set_items(self, items):
+        old = self.items
+        if old == items:
+            return 0, 0
+        limit = min(len(old), len(items))
+        prefix = 0
+        while prefix < limit and old[prefix] == items[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old[-1 - suffix] == items[-1 - suffix]:
+            suffix += 1
+        removed = len(old) - suffix - prefix
+        added = len(items) - suffix - prefix
+        if removed:
+            self.beginRemoveRows(QModelIndex(), prefix, prefix + removed - 1)
+            del old[prefix:prefix + removed]
+            self.endRemoveRows()
+        if added:
+            self.beginInsertRows(QModelIndex(), prefix, prefix + added - 1)
+            old[prefix:prefix] = items[prefix:prefix + added]
+            self.endInsertRows()
+        return added, removed
+
+# follows a file by byte offset and inode so only appended bytes are read
+class LogTail:
+    def __init__(self, file_path, field, tail_bytes, index_key=None, on_change=None):
+        self.file_path = file_path
+        self.field = field
+        self.tail_bytes = tail_bytes
+        self.index_key = index_key
+        self.partial_line = ''
+        self.inode = None
+        self.offset = 0
+        self.start_offset = 0
+        self.decoder = None
+        self.loading = False
+        self.watcher = QFileSystemWatcher(field)
+        self.watcher.fileChanged.connect(on_change or self.update)
+        field.verticalScrollBar().valueChanged.connect(self.handle_scroll)
+
+    def reload(self):
+        with open(self.file_path, 'a') as file:
+            pass
+        with open(self.file_path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            start = max(0, stat.st_size - self.tail_bytes)
+            file.seek(start)
+            data = file.read(stat.st_size - start)
+        start, data = self.align_to_line(start, data)
+        self.inode = stat.st_ino
+        self.offset = start + len(data)
+        self.start_offset = start
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        text = self.decoder.decode(data)
+        self.loading = True
+        self.field.setPlainText(text)
+        if self.index_key is not None:
+            lines = text.split('\n')
+            self.partial_line = lines.pop()
+            search_index.set_section_items(self.index_key, [line for line in lines if line.strip()])
+        scroll_bar = self.field.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum())
+        self.loading = False
+        self.watch()
+
+    def update(self, *args):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self.inode or stat.st_size < self.offset:
+            # first load, rotation or truncation
+            self.reload()
+            return
+        self.watch()
+        if stat.st_size == self.offset:
+            return
+        with open(self.file_path, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read(stat.st_size - self.offset)
+        self.offset += len(data)
+        scroll_bar = self.field.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum()
+        text = self.decoder.decode(data)
+        cursor = QTextCursor(self.field.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        if self.index_key is not None:
+            lines = (self.partial_line + text).split('\n')
+            self.partial_line = lines.pop()
+            search_index.add_items(self.index_key, lines)
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+
+    def load_previous_page(self):
+        start = max(0, self.start_offset - self.tail_bytes)
+        with open(self.file_path, 'rb') as file:
+            file.seek(start)
+            data = file.read(self.start_offset - start)
+        start, data = self.align_to_line(start, data)
+        self.start_offset = start
+        scroll_bar = self.field.verticalScrollBar()
+        distance_from_bottom = scroll_bar.maximum() - scroll_bar.value()
+        self.loading = True
+        text = data.decode('utf-8', errors='replace')
+        cursor = QTextCursor(self.field.document())
+        cursor.movePosition(QTextCursor.Start)
+        cursor.insertText(text)
+        if self.index_key is not None:
+            search_index.add_items(self.index_key, text.split('\n'))
+        scroll_bar.setValue(scroll_bar.maximum() - distance_from_bottom)
+        self.loading = False
+
+    def handle_scroll(self, value):
+        if not self.loading and self.start_offset > 0 and value == self.field.verticalScrollBar().minimum():
+            self.load_previous_page()
+
+    def watch(self):
+        # the watcher drops a path once the file is replaced, so keep re-adding it
+        if self.file_path not in self.watcher.files():
+            self.watcher.addPath(self.file_path)
+
+    @staticmethod
+    def align_to_line(start, data):
+        if start == 0:
+            return start, data
+        newline = data.find(b'\n')
+        if newline == -1:
+            return start, data
+        return start + newline + 1, data[newline + 1:]
+
+# a long-lived /bin/sh that runs one command at a time, framing each result with a sentinel
+class ShellWorker:
+    def __init__(self, shell='/bin/sh'):
+        self.shell = shell
+        self.process = None
+        self.sentinel = None
+
+    def spawn(self):
+        self.sentinel = '__CMD_PAL_{}__'.format(os.urandom(16).hex()).encode()
+        count_process_spawn()
+        self.process = subprocess.Popen([self.shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+
+    def kill(self):
+        if self.process is not None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.process.wait()
+            self.process = None
+
+    def run(self, command, timeout=None, cwd=None):
+        if self.process is None or self.process.poll() is not None:
+            self.spawn()
+        sentinel = self.sentinel.decode()
+        change_directory = "cd {} && ".format(shlex.quote(cwd)) if cwd else ""
+        # the subshell keeps cd, exit and variables from leaking into the next command
+        script = "( {}eval {} ) </dev/null\nprintf '\\n%s %d\\n' {} $?\nprintf '\\n%s\\n' {} >&2\n".format(change_directory, shlex.quote(command), sentinel, sentinel)
+        try:
+            self.process.stdin.write(script.encode())
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            self.kill()
+            self.spawn()
+            self.process.stdin.write(script.encode())
+            self.process.stdin.flush()
+        stdout, stderr, returncode = self.read_result(command, timeout)
+        return subprocess.CompletedProcess(command, returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace'))
+
+    def read_result(self, command, timeout):
+        stdout_stream, stderr_stream = self.process.stdout, self.process.stderr
+        stdout_marker = b'\n' + self.sentinel + b' '
+        stderr_marker = b'\n' + self.sentinel + b'\n'
+        buffers = {stdout_stream: b'', stderr_stream: b''}
+        done = {stdout_stream: False, stderr_stream: False}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            for stream in buffers:
+                selector.register(stream, selectors.EVENT_READ)
+            while not all(done.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.kill()
+                    raise subprocess.TimeoutExpired(command, timeout)
+                for key, _ in selector.select(remaining):
+                    chunk = os.read(key.fd, 65536)
+                    if not chunk:
+                        # the shell died under the command; it is respawned on the next run
+                        self.kill()
+                        return buffers[stdout_stream], buffers[stderr_stream] + b'shell worker exited\n', -1
+                    buffer = buffers[key.fileobj] = buffers[key.fileobj] + chunk
+                    if key.fileobj is stdout_stream:
+                        done[stdout_stream] = stdout_marker in buffer and buffer.endswith(b'\n')
+                    else:
+                        done[stderr_stream] = buffer.endswith(stderr_marker)
+        stdout = buffers[stdout_stream]
+        index = stdout.rfind(stdout_marker)
+        returncode = int(stdout[index + len(stdout_marker):])
+        return stdout[:index], buffers[stderr_stream][:-len(stderr_marker)], returncode
+
+class ShellPool:
+    def __init__(self, size=SHELL_WORKERS):
+        self.workers = [ShellWorker() for _ in range(size)]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def run(self, command, timeout=None, cwd=None):
+        worker = self.idle.get()
+        try:
+            return worker.run(command, timeout, cwd)
+        finally:
+            self.idle.put(worker)
+
+    def close(self):
+        for worker in self.workers:
+            worker.kill()
+
+class SectionState:
+    def __init__(self, key, interval):
+        self.key = key
+        self.fingerprint = None
+        self.base_interval = interval
+        self.interval = interval
+        self.metrics = None
+        self.last_output = None
+        self.stored_items = None
+        self.rerender = None
+
+# a small ring buffer of timings for one section, or for run/append activity
+class SectionMetrics:
+    FIELDS = ('command', 'parse', 'render', 'bytes', 'added', 'removed')
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.samples = deque(maxlen=METRICS_HISTORY)
+
+    def record(self, **sample):
+        sample['time'] = time.time()
+        self.samples.append(sample)
+        self.count += 1
+
+    def last(self, field):
+        return self.samples[-1].get(field, 0) if self.samples else 0
+
+    def average(self, field):
+        samples = list(self.samples)
+        return sum(sample.get(field, 0) for sample in samples) / len(samples) if samples else 0
+
+class ScheduledRefresh:
+    def __init__(self, refresh, interval, next_due):
+        self.refresh = refresh
+        self.interval = interval
+        self.next_due = next_due
+        self.last_run = None
+
+# owns every section refresh: one timer, coalesced batches, a global concurrency cap,
+# the interaction pause and the slowdown while the palette is collapsed
+class RefreshScheduler(QObject):
+    def __init__(self, executor):
+        super().__init__()
+        self.executor = executor
+        self.entries = {}
+        self.backgrounded = False
+        self.stopped = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run_due)
+
+    def add(self, key, refresh, interval, delay=0):
+        self.entries[key] = ScheduledRefresh(refresh, interval, time.monotonic() + delay)
+        self.schedule()
+
+    def remove(self, key):
+        self.entries.pop(key, None)
+        self.schedule()
+
+    def set_interval(self, key, interval):
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        entry.interval = interval
+        if entry.last_run is not None:
+            entry.next_due = min(entry.next_due, entry.last_run + self.effective_interval(entry))
+        self.schedule()
+
+    def set_backgrounded(self, backgrounded):
+        if backgrounded == self.backgrounded:
+            return
+        self.backgrounded = backgrounded
+        if not backgrounded:
+            # pull in anything that was pushed out while collapsed
+            for entry in self.entries.values():
+                if entry.last_run is not None:
+                    entry.next_due = min(entry.next_due, entry.last_run + entry.interval)
+        self.schedule()
+
+    def stop(self):
+        self.stopped = True
+        self.timer.stop()
+
+    def effective_interval(self, entry):
+        if self.backgrounded:
+            return entry.interval * BACKGROUND_INTERVAL_FACTOR
+        return entry.interval
+
+    def schedule(self):
+        if self.stopped or not self.entries or (self.backgrounded and BACKGROUND_INTERVAL_FACTOR == 0):
+            self.timer.stop()
+            return
+        delay = min(entry.next_due for entry in self.entries.values()) - time.monotonic()
+        self.timer.start(max(0, int(delay * 1000)))
+
+    def run_due(self):
+        if self.backgrounded and BACKGROUND_INTERVAL_FACTOR == 0:
+            return
+        if not should_reload():
+            self.timer.start(max(0, int((next_reload_time - datetime.now()).total_seconds() * 1000)))
+            return
+        now = time.monotonic()
+        due = [entry for entry in self.entries.values() if entry.next_due <= now + SCHEDULER_COALESCE_WINDOW]
+        due.sort(key=lambda entry: entry.next_due)
+        for entry in due:
+            if len(self.executor.waiting) >= MAX_CONCURRENT_REFRESHES:
+                entry.next_due = now + SCHEDULER_RETRY_DELAY
+                continue
+            interval = self.effective_interval(entry)
+            entry.last_run = now
+            entry.next_due = now + interval + random.uniform(0, interval * SCHEDULER_JITTER)
+            entry.refresh()
+        self.schedule()
+
+# reads the last entries of a shell history file in-process, from the end of the file
+class HistoryReader:
+    ZSH_EXTENDED_PREFIX = re.compile(r'^: \d+:\d+;')
+    BASH_TIMESTAMP = re.compile(r'^#\d+$')
+
+    def __init__(self, file_path, limit, history_format='auto'):
+        self.file_path = file_path
+        self.limit = limit
+        self.history_format = history_format
+        self.signature = None
+        self.entries = []
+
+    # returns (entries, changed), oldest entry first
+    def read(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            changed = self.signature is not None
+            self.signature = None
+            self.entries = []
+            return self.entries, changed
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if signature == self.signature:
+            return self.entries, False
+        self.signature = signature
+        self.entries = self.read_last_entries(stat.st_size)
+        return self.entries, True
+
+    def read_last_entries(self, size):
+        data = b''
+        position = size
+        with open(self.file_path, 'rb') as file:
+            while position > 0:
+                step = min(HISTORY_READ_BLOCK_SIZE, position)
+                position -= step
+                file.seek(position)
+                data = file.read(step) + data
+                entries = self.parse(data)
+                # the first entry may be cut off, so read until there is one to spare
+                if self.limit and len(entries) > self.limit:
+                    break
+        if position > 0:
+            entries = entries[1:]
+        return entries[-self.limit:] if self.limit else entries
+
+    def parse(self, data):
+        history_format = self.history_format
+        if history_format == 'auto':
+            history_format = self.detect_format(data)
+        if history_format == 'zsh':
+            data = self.unmetafy(data)
+        lines = data.decode('utf-8', errors='replace').split('\n')
+        if lines and lines[-1] == '':
+            lines.pop()
+
+        entries = []
+        if history_format == 'zsh':
+            continued = False
+            for line in lines:
+                if continued and entries:
+                    entries[-1] += '\n' + line
+                else:
+                    entries.append(self.ZSH_EXTENDED_PREFIX.sub('', line, count=1))
+                # zsh stores multi-line commands with a trailing backslash on each continued line
+                continued = line.endswith('\\')
+                if continued:
+                    entries[-1] = entries[-1][:-1]
+        elif history_format == 'bash':
+            entries = [line for line in lines if not self.BASH_TIMESTAMP.match(line)]
+        else:
+            entries = lines
+        return [entry for entry in entries if entry.strip()]
+
+    def detect_format(self, data):
+        name = os.path.basename(self.file_path)
+        if 'zsh' in name:
+            return 'zsh'
+        if 'bash' in name:
+            return 'bash'
+        if 'pry' in name:
+            return 'pry'
+        if self.ZSH_EXTENDED_PREFIX.search(data[-4096:].decode('utf-8', errors='replace').split('\n', 1)[-1]):
+            return 'zsh'
+        return 'bash'
+
+    # zsh escapes bytes >= 0x83 as 0x83 followed by the byte xor 32
+    @staticmethod
+    def unmetafy(data):
+        if b'\x83' not in data:
+            return data
+        result = bytearray()
+        escaped = False
+        for byte in data:
+            if escaped:
+                result.append(byte ^ 32)
+                escaped = False
+            elif byte == 0x83:
+                escaped = True
+            else:
+                result.append(byte)
+        return bytes(result)
+
+# keeps each distinct clipboard value once, newest last, within a count and size budget
+class ClipboardHistory(QObject):
+    updated = pyqtSignal()
+
+    def __init__(self, max_items, max_bytes, parent=None):
+        super().__init__(parent)
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self.size = 0
+        self.last_digest = None
+
+    # called on clipboard change notifications and from the scheduler, since those are not
+    # delivered everywhere while the app is in the background
+    def read_clipboard(self):
+        text = QApplication.clipboard().text()
+        if text.strip() and self.add(text):
+            self.updated.emit()
+
+    def add(self, text):
+        data = text.encode(errors='replace')
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if digest == self.last_digest:
+            return False
+        self.last_digest = digest
+        entry = self.entries.pop(digest, None)
+        if entry is None:
+            compressed = len(data) > CLIPBOARD_COMPRESS_BYTES
+            payload = zlib.compress(data) if compressed else data
+            if len(payload) > self.max_bytes:
+                return False
+            entry = (payload, compressed, button_label(text[:CLIPBOARD_PREVIEW_CHARS]))
+            self.size += len(payload)
+        self.entries[digest] = entry
+        while len(self.entries) > self.max_items or self.size > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self.size -= len(self.entries.pop(oldest)[0])
+        return True
+
+    def text(self, digest):
+        payload, compressed, label = self.entries[digest]
+        return (zlib.decompress(payload) if compressed else payload).decode(errors='replace')
+
+    def label(self, digest):
+        return self.entries[digest][2]
+
+    def preview(self, digest):
+        text = self.text(digest)
+        return text[:CLIPBOARD_PREVIEW_CHARS] + "..." if len(text) > CLIPBOARD_PREVIEW_CHARS else text
+
+    # values small enough to hold in the search index as plain text
+    def small_texts(self):
+        return [self.text(digest) for digest, entry in self.entries.items() if not entry[1]]
+
+# records how long the staged startup takes to paint and to fill every section
+class StartupProfile(QObject):
+    def __init__(self, started):
+        super().__init__()
+        self.started = started
+        self.marks = []
+        self.painted = False
+        self.unpopulated = set()
+        self.unrefreshed = set()
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter()))
+
+    def expect(self, key):
+        self.unpopulated.add(key)
+        self.unrefreshed.add(key)
+
+    def populated(self, key):
+        if key in self.unpopulated:
+            self.unpopulated.discard(key)
+            if not self.unpopulated:
+                self.mark("all sections populated")
+
+    def refreshed(self, key):
+        self.populated(key)
+        if key in self.unrefreshed:
+            self.unrefreshed.discard(key)
+            if not self.unrefreshed:
+                self.mark("all sections refreshed")
+                self.report()
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and not self.painted:
+            self.painted = True
+            self.mark("first paint")
+        return False
+
+    def report(self):
+        for label, at in self.marks:
+            print("{:<26} {:8.1f} ms".format(label, (at - self.started) * 1000), file=sys.stderr)
+
+# remembers entries per section on disk; reads come from memory, writes are batched on a background thread
+class CommandStore:
+    def __init__(self, path):
+        import sqlite3  # only paid for when a section uses the store
+        self.path = path
+        self.entries = {}
+        self.queue = queue.Queue()
+        self.reader = sqlite3.connect(path)
+        self.reader.execute("PRAGMA journal_mode=WAL")
+        self.reader.execute("""CREATE TABLE IF NOT EXISTS items (
+            section TEXT NOT NULL, item TEXT NOT NULL,
+            first_seen REAL NOT NULL, last_seen REAL NOT NULL,
+            last_used REAL NOT NULL DEFAULT 0, use_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (section, item))""")
+        self.reader.commit()
+        self.total = self.reader.execute("SELECT count(*) FROM items").fetchone()[0]
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    # section -> {item: [first_seen, last_seen, last_used, use_count]}
+    def load(self, section):
+        entries = self.entries.get(section)
+        if entries is None:
+            rows = self.reader.execute("SELECT item, first_seen, last_seen, last_used, use_count FROM items WHERE section = ?", (section,))
+            entries = self.entries[section] = {row[0]: list(row[1:]) for row in rows}
+        return entries
+
+    def record_seen(self, section, items):
+        entries = self.load(section)
+        now = time.time()
+        for item in items:
+            entry = entries.get(item)
+            if entry is None:
+                entries[item] = [now, now, 0, 0]
+                self.total += 1
+                self.queue.put(("seen", section, item, now))
+            elif now - entry[1] >= STORE_SEEN_REFRESH:
+                # still in the output: keep it fresh for frecency and pruning, without a write every tick
+                entry[1] = now
+                self.queue.put(("seen", section, item, now))
+        if len(entries) > STORE_MAX_ITEMS_PER_SECTION:
+            for item in sorted(entries, key=lambda item: max(entries[item][1], entries[item][2]))[:len(entries) - STORE_MAX_ITEMS_PER_SECTION]:
+                del entries[item]
+                self.total -= 1
+            self.queue.put(("prune", section))
+        if self.total > STORE_MAX_ITEMS:
+            self.prune_all()
+
+    def record_used(self, section, item):
+        entries = self.load(section)
+        if item not in entries:
+            entries[item] = [time.time(), time.time(), 0, 0]
+            self.total += 1
+        entry = entries[item]
+        entry[2] = time.time()
+        entry[3] += 1
+        self.queue.put(("used", section, item, entry[2]))
+        if self.total > STORE_MAX_ITEMS:
+            self.prune_all()
+
+    # evict the oldest entries across every section, loaded or not; goes a tenth below the cap so this doesn't run on every new item
+    def prune_all(self):
+        excess = self.total - STORE_MAX_ITEMS + STORE_MAX_ITEMS // 10
+        candidates = [(max(entry[1], entry[2]), section, item) for section, entries in self.entries.items() for item, entry in entries.items()]
+        loaded = tuple(self.entries)
+        candidates.extend(self.reader.execute("SELECT max(last_seen, last_used), section, item FROM items WHERE section NOT IN ({}) "
+                                              "ORDER BY 1 LIMIT ?".format(", ".join("?" * len(loaded))), loaded + (excess,)))
+        evicted = [(section, item) for _, section, item in heapq.nsmallest(excess, candidates)]
+        for section, item in evicted:
+            entries = self.entries.get(section)
+            if entries is not None:
+                del entries[item]
+        self.total -= len(evicted)
+        self.queue.put(("forget", evicted))
+
+    def frecent(self, section, limit):
+        now = time.time()
+        def score(entry):
+            return (entry[3] + 1) * 0.5 ** ((now - max(entry[1], entry[2])) / FRECENCY_HALF_LIFE)
+        entries = self.load(section)
+        return heapq.nlargest(limit, entries, key=lambda item: score(entries[item]))
+
+    def write_loop(self):
+        import sqlite3
+        connection = sqlite3.connect(self.path)
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + STORE_FLUSH_INTERVAL
+            while batch[-1] is not None and time.monotonic() < deadline:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            with connection:
+                for operation in batch:
+                    self.write(connection, operation)
+        connection.close()
+
+    @staticmethod
+    def write(connection, operation):
+        if operation[0] == "seen":
+            _, section, item, now = operation
+            connection.execute("INSERT INTO items (section, item, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                               "ON CONFLICT (section, item) DO UPDATE SET last_seen = excluded.last_seen", (section, item, now, now))
+        elif operation[0] == "used":
+            _, section, item, now = operation
+            connection.execute("INSERT INTO items (section, item, first_seen, last_seen, last_used, use_count) VALUES (?, ?, ?, ?, ?, 1) "
+                               "ON CONFLICT (section, item) DO UPDATE SET last_used = excluded.last_used, use_count = use_count + 1", (section, item, now, now, now))
+        elif operation[0] == "prune":
+            _, section = operation
+            connection.execute("DELETE FROM items WHERE section = ? AND rowid NOT IN (SELECT rowid FROM items WHERE section = ? "
+                               "ORDER BY max(last_seen, last_used) DESC LIMIT ?)", (section, section, STORE_MAX_ITEMS_PER_SECTION))
+        elif operation[0] == "forget":
+            _, evicted = operation
+            connection.executemany("DELETE FROM items WHERE section = ? AND item = ?", evicted)
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join(timeout=5)
+        self.reader.close()
+
+# trigram index over the entries of every section, kept up to date as outputs change
+class SearchIndex:
+    def __init__(self):
+        self.documents = {}
+        self.sections = {}
+        self.section_info = {}
+        self.trigrams = {}
+        self.pending = {}
+        self.next_id = 0
+
+    def set_section(self, key, name, action):
+        self.section_info[key] = (name, action)
+
+    # index only what was added and drop only what disappeared; large loads are indexed a chunk per event loop turn
+    def set_section_items(self, key, items):
+        current = self.sections.setdefault(key, {})
+        wanted = {text for text in items if text.strip()}
+        for text in current.keys() - wanted:
+            self.remove(key, text)
+        added = [text for text in dict.fromkeys(items) if text in wanted and text not in current]
+        if len(added) <= SEARCH_INDEX_CHUNK:
+            self.pending.pop(key, None)
+            for text in added:
+                self.add(key, text)
+        else:
+            if not self.pending:
+                QTimer.singleShot(0, self.index_pending)
+            self.pending[key] = deque(added)
+
+    def index_pending(self):
+        budget = SEARCH_INDEX_CHUNK
+        for key in list(self.pending):
+            pending = self.pending[key]
+            current = self.sections.get(key)
+            while pending and budget and current is not None:
+                text = pending.popleft()
+                if text not in current:
+                    self.add(key, text)
+                    budget -= 1
+            if not pending or current is None:
+                del self.pending[key]
+            if not budget:
+                break
+        if self.pending:
+            QTimer.singleShot(0, self.index_pending)
+
+    def add_items(self, key, items):
+        current = self.sections.setdefault(key, {})
+        for text in items:
+            if text.strip() and text not in current:
+                self.add(key, text)
+
+    def remove_section(self, key):
+        for text in list(self.sections.get(key, {})):
+            self.remove(key, text)
+        self.sections.pop(key, None)
+        self.section_info.pop(key, None)
+        self.pending.pop(key, None)
+
+    def add(self, key, text):
+        doc_id = self.next_id
+        self.next_id += 1
+        lowered = text.lower()
+        self.documents[doc_id] = (text, lowered, key)
+        self.sections[key][text] = doc_id
+        for trigram in self.trigrams_of(lowered[:SEARCH_INDEXED_CHARS]):
+            postings = self.trigrams.get(trigram)
+            if postings is None:
+                postings = self.trigrams[trigram] = set()
+            postings.add(doc_id)
+
+    def remove(self, key, text):
+        doc_id = self.sections[key].pop(text)
+        _, lowered, _ = self.documents.pop(doc_id)
+        for trigram in self.trigrams_of(lowered[:SEARCH_INDEXED_CHARS]):
+            postings = self.trigrams.get(trigram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self.trigrams[trigram]
+
+    @staticmethod
+    def trigrams_of(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    # returns [(text, section name, action)], best match first
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        query = query.lower().strip()
+        if not query:
+            return []
+        tokens = query.split()
+        indexed = [token for token in tokens if len(token) >= 3]
+        if indexed:
+            postings = []
+            for token in indexed:
+                for trigram in self.trigrams_of(token):
+                    found = self.trigrams.get(trigram)
+                    if found is None:
+                        postings = None
+                        break
+                    postings.append(found)
+                if postings is None:
+                    break
+            candidates = self.newest_candidates(sorted(postings, key=len)) if postings else []
+        else:
+            candidates = self.newest(SEARCH_FUZZY_SCAN_LIMIT)
+
+        scored = []
+        for doc_id in candidates:
+            lowered = self.documents[doc_id][1]
+            if all(token in lowered for token in tokens):
+                scored.append((self.score(query, lowered, doc_id), doc_id))
+                if len(scored) >= SEARCH_SCORE_LIMIT:
+                    break
+        if not scored:
+            # fall back to subsequence matches among the newest entries, ranked by how tight they are
+            pattern = re.compile('.*?'.join(re.escape(character) for character in query if not character.isspace()))
+            for doc_id in self.newest(SEARCH_FUZZY_SCAN_LIMIT):
+                lowered = self.documents[doc_id][1]
+                match = pattern.search(lowered)
+                if match:
+                    scored.append((match.start() - match.end() - len(lowered) / 1000, doc_id))
+
+        results = []
+        for _, doc_id in heapq.nlargest(limit, scored):
+            text, _, key = self.documents[doc_id]
+            name, action = self.section_info.get(key, (str(key), 'insert'))
+            results.append((text, name, action, key))
+        return results
+
+    def score(self, query, lowered, doc_id):
+        score = 100 - min(len(lowered), 200) / 10 + doc_id / (self.next_id or 1)
+        position = lowered.find(query)
+        if position == 0:
+            score += 50
+        elif position > 0:
+            score += 30 if not lowered[position - 1].isalnum() else 20
+        return score
+
+    # the newest SEARCH_SCORE_LIMIT documents in every posting set. Ids are small ints, so a C sort of
+    # the intersection is far cheaper than heapq.nlargest, which compares in Python
+    def newest_candidates(self, postings):
+        candidates = postings[0].intersection(*postings[1:])
+        if len(candidates) <= SEARCH_SCORE_LIMIT:
+            return candidates
+        return sorted(candidates)[-SEARCH_SCORE_LIMIT:]
+
+    # document ids only grow, so the newest entries are at the end of the dict
+    def newest(self, count):
+        return itertools.islice(reversed(self.documents), count)
+
+# one command polled by the daemon on behalf of every client subscribed to it
+class DaemonJob:
+    def __init__(self, command, cwd, timeout):
+        self.command = command
+        self.cwd = cwd
+        self.timeout = timeout
+        self.subscribers = {}
+        self.fingerprint = None
+        self.message = None
+
+    def interval(self):
+        return min(self.subscribers.values())
+
+# --daemon: polls the commands attached palettes subscribe to and pushes changed results back.
+# Each (command, cwd) runs once, at the shortest interval any client asked for.
+# Messages are newline-delimited JSON:
+#   client -> daemon: {"op": "subscribe", "id": ..., "command": ..., "cwd": ..., "interval": ..., "timeout": ...}
+#                     {"op": "unsubscribe", "id": ...}
+#   daemon -> client: {"op": "result", "id": ..., "output": ..., "error": ..., "elapsed": ...}
+class PollerDaemon(QObject):
+    def __init__(self, path):
+        super().__init__()
+        from PyQt5.QtNetwork import QLocalServer  # only paid for by --daemon
+        self.jobs = {}
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        QLocalServer.removeServer(path)
+        if not self.server.listen(path):
+            raise OSError(self.server.errorString())
+        self.server.newConnection.connect(self.accept)
+
+    def accept(self):
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            connection.buffer = b''
+            connection.subscriptions = {}
+            connection.readyRead.connect(partial(self.read, connection))
+            connection.disconnected.connect(partial(self.disconnect_client, connection))
+
+    def read(self, connection):
+        *lines, connection.buffer = (connection.buffer + bytes(connection.readAll())).split(b'\n')
+        for line in lines:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            # one client sending a bad message must not take the daemon down for the others
+            if not isinstance(message, dict) or not self.valid_id(message.get('id')):
+                continue
+            if message.get('op') == 'subscribe':
+                subscription = self.parse_subscription(message)
+                if subscription is None:
+                    continue
+                self.subscribe(connection, *subscription)
+            elif message.get('op') == 'unsubscribe':
+                self.unsubscribe(connection, message['id'])
+
+    @staticmethod
+    def valid_id(subscription):
+        return isinstance(subscription, (int, str)) and not isinstance(subscription, bool)
+
+    @staticmethod
+    def positive_number(value, default):
+        if value is None:
+            return default
+        if isinstance(value, bool):
+            return None
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        return number if 0 < number < float('inf') else None
+
+    # (id, command, cwd, interval, timeout), or None when a field is missing or has the wrong type
+    def parse_subscription(self, message):
+        command = message.get('command')
+        cwd = message.get('cwd')
+        interval = self.positive_number(message.get('interval'), 1)
+        timeout = self.positive_number(message.get('timeout'), DEFAULT_COMMAND_TIMEOUT)
+        if not isinstance(command, str) or not command.strip() or not (cwd is None or isinstance(cwd, str)) or interval is None or timeout is None:
+            return None
+        return message['id'], command, cwd or None, max(1, interval), timeout
+
+    def subscribe(self, connection, subscription, command, cwd, interval, timeout):
+        self.unsubscribe(connection, subscription)
+        key = (command, cwd)
+        job = self.jobs.get(key)
+        if job is None:
+            job = self.jobs[key] = DaemonJob(command, cwd, timeout)
+        connection.subscriptions[subscription] = key
+        job.subscribers[(connection, subscription)] = interval
+        if key in scheduler.entries:
+            scheduler.set_interval(key, job.interval())
+        else:
+            scheduler.add(key, partial(self.refresh, key), job.interval())
+        if job.message is not None:
+            self.send(connection, subscription, job.message)
+
+    def unsubscribe(self, connection, subscription):
+        job = self.jobs.get(connection.subscriptions.pop(subscription, None))
+        if job is None:
+            return
+        key = (job.command, job.cwd)
+        job.subscribers.pop((connection, subscription), None)
+        if job.subscribers:
+            scheduler.set_interval(key, job.interval())
+        else:
+            del self.jobs[key]
+            scheduler.remove(key)
+            executor.cancel(key)
+
+    def close(self):
+        self.jobs.clear()
+        scheduler.stop()
+        self.server.close()
+
+    def disconnect_client(self, connection):
+        for subscription in list(connection.subscriptions):
+            self.unsubscribe(connection, subscription)
+        connection.deleteLater()
+
+    def refresh(self, key):
+        job = self.jobs[key]
+        executor.submit(key, job.command, job.timeout, partial(self.deliver, key), job.cwd, job.interval())
+
+    def deliver(self, key, output, error, elapsed):
+        job = self.jobs.get(key)
+        if job is None:
+            return
+        get_metrics("daemon/" + job.command).record(command=elapsed, bytes=len(output))
+        # clients only hear about results that differ from the last one they were sent
+        fingerprint = fingerprint_output(output + "\0" + error)
+        if fingerprint == job.fingerprint:
+            return
+        job.fingerprint = fingerprint
+        job.message = {'output': output, 'error': error, 'elapsed': elapsed}
+        for connection, subscription in list(job.subscribers):
+            self.send(connection, subscription, job.message)
+
+    @staticmethod
+    def send(connection, subscription, message):
+        connection.write(json.dumps(dict(message, op='result', id=subscription)).encode() + b'\n')
+
+# --attach: sections subscribe to a running daemon instead of polling, and resubscribe after reconnecting
+class DaemonClient(QObject):
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.subscriptions = {}
+        self.next_id = 0
+        self.buffer = b''
+        self.reported = False
+        from PyQt5.QtNetwork import QLocalSocket  # only paid for by --attach
+        self.socket = QLocalSocket(self)
+        self.socket.connected.connect(self.resubscribe)
+        self.socket.readyRead.connect(self.read)
+        self.socket.disconnected.connect(self.reconnect_later)
+        self.socket.errorOccurred.connect(self.handle_error)
+        self.connect_to_daemon()
+
+    def connect_to_daemon(self):
+        if self.socket.state() == self.socket.UnconnectedState:
+            self.socket.connectToServer(self.path)
+
+    def reconnect_later(self):
+        QTimer.singleShot(DAEMON_RECONNECT_INTERVAL * 1000, self.connect_to_daemon)
+
+    def handle_error(self, error):
+        if not self.reported:
+            self.reported = True
+            print("[daemon] {}, retrying every {}s".format(self.socket.errorString(), DAEMON_RECONNECT_INTERVAL), file=sys.stderr)
+        self.reconnect_later()
+
+    def subscribe(self, command, cwd, interval, timeout, callback):
+        self.next_id += 1
+        message = {'op': 'subscribe', 'id': self.next_id, 'command': command, 'cwd': cwd, 'interval': interval, 'timeout': timeout}
+        self.subscriptions[self.next_id] = (message, callback)
+        self.send(message)
+        return self.next_id
+
+    def unsubscribe(self, subscription):
+        if self.subscriptions.pop(subscription, None) is not None:
+            self.send({'op': 'unsubscribe', 'id': subscription})
+
+    def send(self, message):
+        if self.socket.state() == self.socket.ConnectedState:
+            self.socket.write(json.dumps(message).encode() + b'\n')
+
+    def resubscribe(self):
+        self.reported = False
+        self.buffer = b''
+        for message, callback in self.subscriptions.values():
+            self.send(message)
+
+    def read(self):
+        *lines, self.buffer = (self.buffer + bytes(self.socket.readAll())).split(b'\n')
+        for line in lines:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            subscription = self.subscriptions.get(message.get('id'))
+            if message.get('op') == 'result' and subscription is not None:
+                subscription[1](message['output'], message['error'], message['elapsed'])
 
 class CustomTextEdit(QTextEdit):
     def __init__(self, *args, **kwargs):
@@ -162,8 +1429,11 @@ def handle_focus_changed(old_widget, new_widget):
         window.original_pos = window.pos()
         window.move(-(window.width() - BACKGROUNDED_LABEL_SIZE), window.y())
         header.setStyleSheet(HEADER_STYLE_BACKGROUND)
+        scheduler.set_backgrounded(True)
     else:
         # showing
+        scheduler.set_backgrounded(False)
+        reset_adaptive_intervals()
         backgrounded_label.hide()
         header.show()
         status_text_field.show()
@@ -173,6 +1443,7 @@ def handle_focus_changed(old_widget, new_widget):
 def load_config(config_path):
     config = configparser.ConfigParser()
     config.read(config_path)
+    config.path = config_path
     return config
 
 def extract_comment(line):
@@ -183,80 +1454,462 @@ def extract_comment(line):
         return comment
     else:
         return None
+def section_key(config, section):
+    return (id(config), section)
+
+section_states = {}
+
+def get_section_state(config, section):
+    key = section_key(config, section)
+    state = section_states.get(key)
+    if state is None:
+        state = section_states[key] = SectionState(key, config.getint(section, 'interval'))
+        state.metrics = get_metrics(metrics_name(config, section))
+    return state
+
+section_metrics = {}
+
+def get_metrics(name):
+    metrics = section_metrics.get(name)
+    if metrics is None:
+        metrics = section_metrics[name] = SectionMetrics(name)
+    return metrics
+
+# the full config path, so the same section name in two configs with the same file name stays apart
+def metrics_name(config, section):
+    return "{}/{}".format(os.path.abspath(getattr(config, 'path', '')), section)
+
+def set_section_interval(state, interval):
+    if interval != state.interval:
+        state.interval = interval
+        scheduler.set_interval(state.key, interval)
+
+# back off while a section's output is stable, snap back as soon as it changes
+def adapt_interval(section, config, changed):
+    if not config.getboolean(section, 'adaptive', fallback=False):
+        return
+    state = get_section_state(config, section)
+    if changed:
+        set_section_interval(state, state.base_interval)
+    else:
+        max_interval = config.getint(section, 'max_interval', fallback=state.base_interval * ADAPTIVE_MAX_INTERVAL_FACTOR)
+        set_section_interval(state, min(state.interval * 2, max_interval))
+
+def reset_adaptive_intervals():
+    for state in section_states.values():
+        set_section_interval(state, state.base_interval)
+
 def create_update_output_lambda(section, output_layout, scroll_area, config):
     return lambda: update_output(section, output_layout, scroll_area, config)
 
 def create_start_process_lambda(section, output_layout, scroll_area, config):
     return lambda: start_process(section, output_layout, scroll_area, config)
 
-def clear_section_buttons(output_layout):
-    for i in reversed(range(output_layout.count())):
-        item = output_layout.itemAt(i)
-        if item is not None:
-            widget = item.widget()
-            if isinstance(widget, HoverButton):
-                output_layout.removeWidget(widget)
-                widget.deleteLater()
-
-def remove_existing_buttons(output_layout, content):
-    for i in range(output_layout.count()):
-        item = output_layout.itemAt(i)
-        if item is not None:
-            widget = item.widget()
-            if isinstance(widget, HoverButton) and widget.text() == content:
-                output_layout.removeWidget(widget)
+def section_button_keys(output_layout):
+    return [output_layout.itemAt(i).widget().key for i in range(output_layout.count())]
+
+# diff the wanted keys against the buttons already in the layout and only touch what changed
+def reconcile_buttons(output_layout, keys, create_button):
+    buttons = output_layout.buttons
+    wanted = set(keys)
+    added = removed = 0
+    for key in [key for key in buttons if key not in wanted]:
+        button = buttons.pop(key)
+        output_layout.removeWidget(button)
+        button.deleteLater()
+        removed += 1
+    for index, key in enumerate(keys):
+        button = buttons.get(key)
+        if button is None:
+            button = create_button(key)
+            button.key = key
+            buttons[key] = button
+            output_layout.insertWidget(index, button)
+            added += 1
+        elif output_layout.itemAt(index).widget() is not button:
+            output_layout.removeWidget(button)
+            output_layout.insertWidget(index, button)
+    return added, removed
+
+def button_label(item):
+    title = extract_comment(item)
+    text = title if title else item
+    display_text = text[:100] + "..." if len(text) > 100 else text
+    return display_text.replace("\n", "  ")
+
+def create_section_button(item, action, key=None):
+    button = HoverButton(button_label(item), window)
+    button.setStyleSheet(HOVER_BUTTON_STYLE)
+    button.mouse_hover.connect(partial(update_text_field, text=item))
+    button.clicked.connect(partial(execute_and_display_result, command=item, action=action))
+    if key is not None:
+        button.clicked.connect(partial(record_section_use, key, item))
+    return button
+
+command_store = None
+stored_sections = set()  # section keys with store = True; the store itself is keyed by section name
+
+def get_command_store():
+    global command_store
+    if command_store is None:
+        command_store = CommandStore(os.path.expanduser("~/.cmd_pal/store.sqlite3"))
+    return command_store
+
+def record_section_use(key, item):
+    if key in stored_sections:
+        get_command_store().record_used(key[1], item)
+        state = section_states.get(key)
+        # frecent sections reorder on use, not just on the next changed poll
+        if state is not None and state.rerender is not None:
+            state.rerender(state.stored_items)
+
+def stored_section_items(section, config, items):
+    store = get_command_store()
+    store.record_seen(section, [item for item in items if item.strip()])
+    if config.get(section, 'order', fallback='output') == 'frecent':
+        return store.frecent(section, config.getint(section, 'max_items', fallback=0) or DEFAULT_FRECENT_LIMIT)
+    return items
 
 command_threads = []
+queued_commands = deque()
+run_output = deque()
+run_output_size = 0
 
 def execute_and_display_result(command, action):
     if action == "run":
-        command_thread = CommandThread(command, action)
-        command_thread.result_signal.connect(status_text_field.append)
-        command_thread.finished.connect(lambda: command_threads.remove(command_thread))
-        command_threads.append(command_thread)
-        command_thread.start()
+        command_thread = CommandThread(command)
+        command_thread.output_signal.connect(queue_run_output)
+        command_thread.finished.connect(partial(finish_command_thread, command_thread))
+        queued_commands.append(command_thread)
+        start_queued_commands()
     else:
         execute_command_in_parent_terminal(command, action)
     
     
-def update_output(section, output_layout, scroll_area, config):
-    if config.getboolean(section, 'clean', fallback=False):
-        clear_section_buttons(output_layout)
-    result = os.popen(config.get(section, 'value')).read()
+def start_queued_commands():
+    while queued_commands and len(command_threads) < MAX_RUN_JOBS:
+        command_thread = queued_commands.popleft()
+        command_threads.append(command_thread)
+        queue_run_output("$ {}\n".format(command_thread.command))
+        command_thread.start()
+    update_jobs_list()
+
+def finish_command_thread(command_thread):
+    command_threads.remove(command_thread)
+    if command_thread.stopping:
+        queue_run_output("\n[stopped] {}\n".format(command_thread.command))
+    elif command_thread.returncode:
+        queue_run_output("\n[exit {}] {}\n".format(command_thread.returncode, command_thread.command))
+    start_queued_commands()
+
+def stop_command_thread(command_thread):
+    if command_thread in queued_commands:
+        queued_commands.remove(command_thread)
+    else:
+        command_thread.stop()
+    update_jobs_list()
+
+def stop_all_command_threads():
+    queued_commands.clear()
+    for command_thread in list(command_threads):
+        command_thread.stopping = True
+        command_thread.kill()
+        command_thread.wait(1000)
+
+# output is collected here and flushed to the status field in batches; only the newest bytes are kept
+def queue_run_output(text):
+    global run_output_size
+    if not text:
+        return
+    run_output.append(text)
+    run_output_size += len(text)
+    while run_output_size - len(run_output[0]) >= RUN_OUTPUT_MAX_PENDING:
+        run_output_size -= len(run_output.popleft())
+    if not run_output_timer.isActive():
+        run_output_timer.start(RUN_OUTPUT_FLUSH_INTERVAL)
+
+def flush_run_output():
+    global run_output_size
+    text = "".join(run_output)[-RUN_OUTPUT_MAX_PENDING:]
+    run_output.clear()
+    run_output_size = 0
+    if not text:
+        return
+    scroll_bar = status_text_field.verticalScrollBar()
+    at_bottom = scroll_bar.value() == scroll_bar.maximum()
+    document = status_text_field.document()
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.End)
+    cursor.insertText(text)
+    excess = document.characterCount() - RUN_OUTPUT_MAX_CHARS
+    if excess > 0:
+        cursor.setPosition(0)
+        cursor.setPosition(excess, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+    if at_bottom:
+        scroll_bar.setValue(scroll_bar.maximum())
+
+def update_jobs_list():
+    jobs_list.clear()
+    jobs_list.jobs = list(command_threads) + list(queued_commands)
+    for command_thread in jobs_list.jobs:
+        if command_thread in queued_commands:
+            state = "queued"
+        elif command_thread.stopping:
+            state = "stopping"
+        else:
+            state = "running"
+        job_item = QListWidgetItem("■ [{}] {}".format(state, button_label(command_thread.command)))
+        job_item.setToolTip("Click to stop, click again to kill\n" + command_thread.command)
+        jobs_list.addItem(job_item)
+    jobs_list.setVisible(bool(jobs_list.jobs))
+
+def stop_job_item(job_item):
+    stop_command_thread(jobs_list.jobs[jobs_list.row(job_item)])
 
+def update_output(section, output_layout, scroll_area, config):
+    if config.get(section, 'type') == 'history':
+        started = time.perf_counter()
+        entries, changed = output_layout.history.read()
+        read_time = time.perf_counter() - started
+        added = removed = parse_time = render_time = 0
+        if changed:
+            started = time.perf_counter()
+            items = list(dict.fromkeys(reversed(entries)))
+            parse_time = time.perf_counter() - started
+            added, removed = render_items(section, output_layout, scroll_area, config, items)
+            render_time = time.perf_counter() - started - parse_time
+        get_section_state(config, section).metrics.record(command=read_time, parse=parse_time, render=render_time,
+                                                          bytes=sum(len(entry) for entry in entries) if changed else 0, added=added, removed=removed)
+        adapt_interval(section, config, changed)
+        section_refreshed(config, section)
+        return
+    timeout = config.getint(section, 'timeout', fallback=DEFAULT_COMMAND_TIMEOUT)
+    callback = partial(handle_command_result, section, output_layout, scroll_area, config)
+    cwd = config.get(section, 'cwd', fallback=None)
+    executor.submit(section_key(config, section), config.get(section, 'value'), timeout, callback,
+                    os.path.expanduser(cwd) if cwd else None, get_section_state(config, section).interval)
+
+def handle_command_result(section, output_layout, scroll_area, config, result, error, elapsed):
+    state = get_section_state(config, section)
+    section_refreshed(config, section)
+    if error:
+        state.metrics.record(command=elapsed)
+        print("[{}] {}".format(section, error), file=sys.stderr)
+        return
+    # skip splitting, dedup and widget work entirely when the output is unchanged
+    started = time.perf_counter()
+    fingerprint = fingerprint_output(result)
+    changed = fingerprint != state.fingerprint
+    added = removed = render_time = 0
+    if changed:
+        state.fingerprint = fingerprint
+        state.last_output = result if len(result) <= SNAPSHOT_MAX_BYTES else None
+        items = parse_output(section, config, result)
+        parse_time = time.perf_counter() - started
+        added, removed = render_items(section, output_layout, scroll_area, config, items)
+        render_time = time.perf_counter() - started - parse_time
+    else:
+        parse_time = time.perf_counter() - started
+        # keep last_seen fresh for items that are still in the output; record_seen throttles the writes
+        if state.stored_items is not None and state.key in stored_sections:
+            get_command_store().record_seen(section, [item for item in state.stored_items if item.strip()])
+    state.metrics.record(command=elapsed, parse=parse_time, render=render_time, bytes=len(result), added=added, removed=removed)
+    adapt_interval(section, config, changed)
+
+def fingerprint_output(result):
+    return hashlib.blake2b(result.encode(errors='replace'), digest_size=16).digest()
+
+# show the output remembered from the last session until the first real poll comes back
+def seed_section(section, output_layout, scroll_area, config, result):
+    state = get_section_state(config, section)
+    state.fingerprint = fingerprint_output(result)
+    state.last_output = result
+    render_output(section, output_layout, scroll_area, config, result)
+    if startup_profile is not None:
+        startup_profile.populated(section_key(config, section))
+
+def section_refreshed(config, section):
+    if startup_profile is not None:
+        startup_profile.refreshed(section_key(config, section))
+
+def render_output(section, output_layout, scroll_area, config, result):
+    return render_items(section, output_layout, scroll_area, config, parse_output(section, config, result))
+
+def parse_output(section, config, result):
     if config.getboolean(section, 'split', fallback=False):
         items = reversed(result.split('\n'))
     else:
         items = [result]
 
-    items = list(dict.fromkeys(items))
+    return list(dict.fromkeys(items))
 
+# returns how many entries were added and removed
+def render_items(section, output_layout, scroll_area, config, items):
+    key = section_key(config, section)
     if config.get(section, 'type') == 'display':
-        output_layout.setPlainText(items[0])
+        lines = truncate_display_text(items[0], config.getint(section, 'max_chars', fallback=DEFAULT_DISPLAY_MAX_CHARS)).split('\n')
+        if config.get(section, 'mode', fallback='replace') == 'append':
+            added, removed = append_display(output_layout, lines)
+        else:
+            added, removed = patch_display(output_layout, lines)
+        search_index.set_section_items(key, lines)
+        return added, removed
+    if key in stored_sections:
+        state = get_section_state(config, section)
+        state.stored_items = items
+        if config.get(section, 'order', fallback='output') == 'frecent':
+            state.rerender = partial(render_items, section, output_layout, scroll_area, config)
+        items = stored_section_items(section, config, items)
+    if isinstance(output_layout, QListView):
+        model = output_layout.model()
+        added, removed = model.set_items(merge_section_items(section, config, model.items, items))
+        if added:
+            output_layout.scrollToBottom()
+        items = model.items
     else:
-        new_items = []
-        for item in items:
-            if not item.strip():
-                continue  # Skip the current iteration and move to the next item
-            title = extract_comment(item)
-            if title:
-                display_text = title[:100] + "..." if len(title) > 100 else title
-            else:
-                display_text = item[:100] + "..." if len(item) > 100 else item
-            display_text = display_text.replace("\n", "  ")
-            button = HoverButton(display_text, window)
-            button.setStyleSheet(HOVER_BUTTON_STYLE)
-            action = config.get(section, 'action', fallback='insert')
-            button.mouse_hover.connect(partial(update_text_field, text=item))
-            button.clicked.connect(partial(execute_and_display_result, command=item, action=action))  # Add this line
-            new_items.append(button)
-
-        for item in new_items:
-            remove_existing_buttons(output_layout, item.text())
-            output_layout.addWidget(item)
-
-        if scroll_area is not None:
+        items = merge_section_items(section, config, section_button_keys(output_layout), items)
+        action = config.get(section, 'action', fallback='insert')
+        added, removed = reconcile_buttons(output_layout, items, partial(create_section_button, action=action, key=key))
+
+        if scroll_area is not None and added:
             scroll_area.ensureWidgetVisible(output_layout.itemAt(output_layout.count() - 1).widget())
+    if added or removed:
+        search_index.set_section_items(key, items)
+    return added, removed
+
+def truncate_display_text(text, max_chars):
+    if max_chars and len(text) > max_chars:
+        return text[:max_chars] + "\n... truncated {} characters".format(len(text) - max_chars)
+    return text
+
+# rewrites only the blocks whose lines changed, so layout work and the scroll position survive a refresh
+def patch_display(display_field, lines):
+    document = display_field.document()
+    scroll_bar = display_field.verticalScrollBar()
+    position = scroll_bar.value()
+    opcodes = diff_lines(display_field.lines, lines)
+    if not display_field.lines or len(opcodes) > DISPLAY_PATCH_MAX_OPS:
+        display_field.setPlainText("\n".join(lines))
+    else:
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        # from the bottom up, so the line numbers of earlier changes stay valid
+        for tag, start, end, new_start, new_end in reversed(opcodes):
+            replace_display_lines(document, cursor, start, end, lines[new_start:new_end])
+        cursor.endEditBlock()
+        if document.blockCount() != len(lines):
+            display_field.setPlainText("\n".join(lines))
+    scroll_bar.setValue(position)
+    display_field.lines = lines
+    return sum(new_end - new_start for _, _, _, new_start, new_end in opcodes), sum(end - start for _, start, end, _, _ in opcodes)
+
+# changed regions as difflib opcodes; the common head and tail are skipped before diffing
+def diff_lines(old_lines, new_lines):
+    head = 0
+    limit = min(len(old_lines), len(new_lines))
+    while head < limit and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old_lines[-1 - tail] == new_lines[-1 - tail]:
+        tail += 1
+    matcher = difflib.SequenceMatcher(None, old_lines[head:len(old_lines) - tail], new_lines[head:len(new_lines) - tail], autojunk=False)
+    return [(tag, start + head, end + head, new_start + head, new_end + head)
+            for tag, start, end, new_start, new_end in matcher.get_opcodes() if tag != 'equal']
+
+def replace_display_lines(document, cursor, start, end, new_lines):
+    if end < document.blockCount():
+        cursor.setPosition(document.findBlockByNumber(start).position())
+        cursor.setPosition(document.findBlockByNumber(end).position(), QTextCursor.KeepAnchor)
+        cursor.insertText("".join(line + "\n" for line in new_lines))
+    elif start > 0:
+        # up to the end of the document: take the newline before the first line instead of after the last
+        previous = document.findBlockByNumber(start - 1)
+        cursor.setPosition(previous.position() + previous.length() - 1)
+        cursor.setPosition(document.characterCount() - 1, QTextCursor.KeepAnchor)
+        cursor.insertText("".join("\n" + line for line in new_lines))
+    else:
+        cursor.select(QTextCursor.Document)
+        cursor.insertText("\n".join(new_lines))
+
+# appends the lines that are new since the previous output, so commands like `tail -n 20 app.log` stream
+def append_display(display_field, lines):
+    if len(lines) > 1 and not lines[-1]:
+        lines = lines[:-1]
+    previous = display_field.lines
+    overlap = 0
+    for size in range(min(len(previous), len(lines)), 0, -1):
+        if previous[-size] == lines[0] and previous[-size:] == lines[:size]:
+            overlap = size
+            break
+    new_lines = lines[overlap:]
+    display_field.lines = lines
+    if not new_lines:
+        return 0, 0
+    document = display_field.document()
+    blocks = 0 if document.isEmpty() else document.blockCount()
+    scroll_bar = display_field.verticalScrollBar()
+    at_bottom = scroll_bar.value() == scroll_bar.maximum()
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.End)
+    cursor.insertText(("\n" if not document.isEmpty() else "") + "\n".join(new_lines))
+    if at_bottom:
+        scroll_bar.setValue(scroll_bar.maximum())
+    return len(new_lines), max(0, blocks + len(new_lines) - document.blockCount())
+
+def setup_display_field(section, config, parent):
+    if config.get(section, 'renderer', fallback='rich') == 'plain':
+        display_field = QPlainTextEdit(parent)
+    else:
+        display_field = QTextEdit(parent)
+    display_field.document().setUndoRedoEnabled(False)
+    if config.get(section, 'mode', fallback='replace') == 'append':
+        display_field.document().setMaximumBlockCount(config.getint(section, 'scrollback', fallback=DEFAULT_DISPLAY_SCROLLBACK))
+    display_field.lines = []
+    return display_field
+
+def merge_section_items(section, config, previous, items):
+    # a frecent ordering already is the full list to show
+    clean = config.getboolean(section, 'clean', fallback=False) or config.get(section, 'order', fallback='output') == 'frecent'
+    items = [item for item in items if item.strip()]
+    if not clean:
+        # keep old entries, moving re-seen ones to the end
+        new_keys = set(items)
+        items = [key for key in previous if key not in new_keys] + items
+    max_items = config.getint(section, 'max_items', fallback=0)
+    if max_items and len(items) > max_items:
+        items = items[:max_items] if clean else items[-max_items:]
+    return items
+
+def create_clipboard_button(digest, history, action):
+    button = HoverButton(history.label(digest), window)
+    button.setStyleSheet(HOVER_BUTTON_STYLE)
+    button.mouse_hover.connect(lambda hover: update_text_field(hover, history.preview(digest)))
+    button.clicked.connect(lambda: execute_and_display_result(history.text(digest), action))
+    return button
+
+def update_clipboard(section, output_layout, scroll_area, config):
+    started = time.perf_counter()
+    history = output_layout.clipboard
+    action = config.get(section, 'action', fallback='insert')
+    added, removed = reconcile_buttons(output_layout, list(history.entries), partial(create_clipboard_button, history=history, action=action))
+    if added:
+        scroll_area.ensureWidgetVisible(output_layout.itemAt(output_layout.count() - 1).widget())
+    search_index.set_section_items(section_key(config, section), history.small_texts())
+    get_section_state(config, section).metrics.record(render=time.perf_counter() - started, bytes=history.size, added=added, removed=removed)
+
+def setup_clipboard(section, output_layout, scroll_area, config, parent):
+    max_items = config.getint(section, 'max_items', fallback=DEFAULT_CLIPBOARD_ITEMS)
+    max_bytes = config.getint(section, 'max_kb', fallback=DEFAULT_CLIPBOARD_MAX_KB) * 1024
+    # parented to the section so hot reload teardown also disconnects it from the clipboard
+    history = output_layout.clipboard = ClipboardHistory(max_items, max_bytes, parent)
+    history.updated.connect(partial(update_clipboard, section, output_layout, scroll_area, config))
+    QApplication.clipboard().dataChanged.connect(history.read_clipboard)
+    return history
+
+def read_clipboard_section(section, history, config):
+    history.read_clipboard()
+    section_refreshed(config, section)
 
 def start_process(section, output_layout, scroll_area, config):
     update_output(section, output_layout, scroll_area, config)
@@ -272,41 +1925,63 @@ def setup_section_widgets(window):
     output_widget = QWidget()
     output_layout = QVBoxLayout()
     output_layout.setAlignment(Qt.AlignTop)
+    output_layout.buttons = {}
     output_widget.setLayout(output_layout)
     output_widget.setStyleSheet(OUTPUT_STYLE)
     scroll_area.setWidget(output_widget)
 
     return scroll_area, output_layout
 
+def setup_section_list(window, key, action):
+    list_view = QListView(window)
+    list_view.setFixedHeight(SCROLL_AREA_FIXED_HEIGHT)
+    list_view.setStyleSheet(LIST_VIEW_STYLE)
+    list_view.setUniformItemSizes(True)
+    list_view.setMouseTracking(True)
+    list_view.setEditTriggers(QListView.NoEditTriggers)
+    list_view.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+    list_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+    list_view.setModel(SectionListModel(list_view))
+    list_view.verticalScrollBar().valueChanged.connect(interacted)
+    list_view.entered.connect(lambda index: update_text_field(True, index.data(Qt.UserRole)))
+    list_view.clicked.connect(lambda index: execute_and_display_result(index.data(Qt.UserRole), action))
+    list_view.clicked.connect(lambda index: record_section_use(key, index.data(Qt.UserRole)))
+    return list_view
+
+def setup_history_reader(section, output_layout, config):
+    file_path = os.path.expanduser(config.get(section, 'value'))
+    limit = config.getint(section, 'limit', fallback=DEFAULT_HISTORY_LIMIT)
+    output_layout.history = HistoryReader(file_path, limit, config.get(section, 'format', fallback='auto'))
+
 def update_text_field(hover, text):
     if hover:
         status_text_field.clear()
         status_text_field.setText(text)
         interacted()
 
-def update_file_contents(section, file_contents_field, config):
+def setup_log_tail(section, file_contents_field, config):
     file_path = os.path.expanduser(config.get(section, 'value'))
-    with open(file_path, 'a') as file:
-        pass
-    with open(file_path, 'r') as file:
-        file_contents = file.read()
-    file_contents_field.setPlainText(file_contents)
-    file_contents_field.verticalScrollBar().setValue(file_contents_field.verticalScrollBar().maximum())
+    tail_bytes = config.getint(section, 'tail_kb', fallback=DEFAULT_LOG_TAIL_KB) * 1024
+    # watcher wakeups go through update_file_contents too, so appends picked up between polls are recorded in the metrics
+    on_change = lambda path: update_file_contents(section, file_contents_field, config)
+    file_contents_field.tail = LogTail(file_path, file_contents_field, tail_bytes, section_key(config, section), on_change)
 
-def handle_timer(section, output_layout, scroll_area, config, timer):
-    if should_reload():
-        start_process(section, output_layout, scroll_area, config)
-        timer.start(config.getint(section, 'interval') * 1000)
-
-def handle_file_timer(section, file_contents_field, config):
-    if should_reload():
-        update_file_contents(section, file_contents_field, config)
+def update_file_contents(section, file_contents_field, config):
+    tail = file_contents_field.tail
+    offset = tail.offset
+    started = time.perf_counter()
+    tail.update()
+    get_section_state(config, section).metrics.record(render=time.perf_counter() - started, bytes=max(0, tail.offset - offset))
+    section_refreshed(config, section)
 
 def append_to_file(section, input_field, file_contents_field, config):
     file_path = os.path.expanduser(config.get(section, 'value'))
     timestamp = datetime.now().strftime("-- %m/%d/%y %I:%M%p --\n\n")
+    text = timestamp + input_field.toPlainText() + '\n'
+    started = time.perf_counter()
     with open(file_path, 'a') as file:
-        file.write(timestamp + input_field.toPlainText() + '\n')
+        file.write(text)
+    get_metrics(metrics_name(config, section) + ":append").record(command=time.perf_counter() - started, bytes=len(text.encode()))
     input_field.clear()
     QTimer.singleShot(0, partial(update_file_contents, section, file_contents_field, config))
 
@@ -328,6 +2003,32 @@ def should_reload():
     result = datetime.now() >= next_reload_time
     return result
 
+shell_pool = None
+process_spawns = 0
+process_spawns_lock = threading.Lock()
+
+def count_process_spawn():
+    global process_spawns
+    with process_spawns_lock:
+        process_spawns += 1
+
+def run_shell_command(command, timeout=None, cwd=None):
+    if shell_pool is not None:
+        return shell_pool.run(command, timeout, cwd)
+    count_process_spawn()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, text=True, errors='replace', start_new_session=True, cwd=cwd)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        # kill the whole pipeline, not just the shell
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.communicate()
+        raise
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
 def execute_command_in_parent_terminal(command, action="insert"):
     if action == "insert":
         encoded_command = base64.b64encode(command.encode()).decode()
@@ -351,9 +2052,438 @@ def execute_command_in_parent_terminal(command, action="insert"):
         applescript = f'tell application "Terminal" to do script "{command}" in front window'
         subprocess.run(['osascript', '-e', applescript], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         return "Done!"
-    elif action == "run":
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, text=True)
-        return result.stdout.strip()
+
+search_index = SearchIndex()
+
+def register_search_section(config, section):
+    search_index.set_section(section_key(config, section), section, config.get(section, 'action', fallback='insert'))
+
+def update_search_results(query):
+    search_results.clear()
+    results = search_index.search(query)
+    for text, name, action, key in results:
+        result_item = QListWidgetItem("[{}] {}".format(name, button_label(text)))
+        result_item.setData(Qt.UserRole, (text, action, key))
+        search_results.addItem(result_item)
+    search_results.setVisible(bool(query.strip()))
+
+def run_search_result(result_item):
+    text, action, key = result_item.data(Qt.UserRole)
+    execute_and_display_result(text, action)
+    record_section_use(key, text)
+
+def run_top_search_result():
+    if search_results.count():
+        run_search_result(search_results.item(0))
+
+def focus_search_field():
+    search_field.setFocus()
+    search_field.selectAll()
+
+startup_profile = None
+startup_snapshot = {}
+daemon_client = None
+daemon_subscriptions = {}
+
+def daemon_socket_path():
+    return os.path.expanduser("~/.cmd_pal/daemon.sock")
+
+def daemon_running(path):
+    from PyQt5.QtNetwork import QLocalSocket
+    probe = QLocalSocket()
+    probe.connectToServer(path)
+    running = probe.waitForConnected(500)
+    probe.abort()
+    return running
+
+# in --attach mode command sections get their results pushed by the daemon instead of polling
+def attach_section(section, output_layout, scroll_area, config):
+    cwd = config.get(section, 'cwd', fallback=None)
+    callback = partial(handle_command_result, section, output_layout, scroll_area, config)
+    daemon_subscriptions[section_key(config, section)] = daemon_client.subscribe(
+        config.get(section, 'value'), os.path.expanduser(cwd) if cwd else None, config.getint(section, 'interval'),
+        config.getint(section, 'timeout', fallback=DEFAULT_COMMAND_TIMEOUT), callback)
+
+def snapshot_key(config, section):
+    return "{}::{}".format(os.path.abspath(getattr(config, 'path', '')), section)
+
+def snapshot_path():
+    return os.path.expanduser("~/.cmd_pal/snapshot.json")
+
+def load_snapshot():
+    try:
+        with open(snapshot_path()) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_snapshot(configs):
+    snapshot = {}
+    for config in configs:
+        for section in config.sections():
+            state = section_states.get(section_key(config, section))
+            if state is not None and state.last_output is not None:
+                snapshot[snapshot_key(config, section)] = state.last_output
+    temporary_path = snapshot_path() + ".tmp"
+    with open(temporary_path, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(temporary_path, snapshot_path())
+
+# builds every widget of one section and registers its refresh; returns the section's container
+def build_section(config, section, first_poll_delay=0, seed=None):
+    container = QWidget(window)
+    section_layout = QVBoxLayout(container)
+    section_layout.setContentsMargins(0, 0, 0, 0)
+    section_layout.setSpacing(5)
+
+    key = section_key(config, section)
+    section_type = config.get(section, 'type')
+    action = config.get(section, 'action', fallback=None)
+    if action:
+        section_label = QLabel(section + " ({})".format(action), container)
+    else:
+        section_label = QLabel(section, container)
+    section_label.setStyleSheet(SECTION_LABEL_STYLE)
+    section_label.setWordWrap(True)
+    spacer_item = QSpacerItem(0, 10, QSizePolicy.Minimum, QSizePolicy.Fixed)
+    section_layout.addItem(spacer_item)
+    section_layout.addWidget(section_label)
+    register_search_section(config, section)
+    if config.getboolean(section, 'store', fallback=False):
+        stored_sections.add(key)
+
+    if section_type == 'log':
+        file_contents_field = QTextEdit(container)
+        file_contents_field.setReadOnly(True)
+        file_contents_field.setStyleSheet(FILE_CONTENTS_FIELD_STYLE)
+        file_contents_field.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        file_contents_field.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        section_layout.addWidget(file_contents_field)
+
+        input_field = CustomTextEdit(container)
+        input_field.setFixedHeight(CUSTOM_TEXT_EDIT_HEIGHT)
+        input_field.setStyleSheet(INPUT_FIELD_STYLE)
+        section_layout.addWidget(input_field)
+        file_contents_field.verticalScrollBar().valueChanged.connect(interacted)
+        spacer_item = QSpacerItem(0, 5, QSizePolicy.Minimum, QSizePolicy.Fixed)
+        section_layout.addItem(spacer_item)
+        submit_button = QPushButton("ADD", container)
+        submit_button.setStyleSheet(SUBMIT_BUTTON_STYLE)
+        submit_button.clicked.connect(partial(append_to_file, section, input_field, file_contents_field, config))
+        section_layout.addWidget(submit_button)
+        setup_log_tail(section, file_contents_field, config)
+        scheduler.add(key, partial(update_file_contents, section, file_contents_field, config), config.getint(section, 'interval'), first_poll_delay)
+
+    elif section_type in ('parse_command', 'history') and config.get(section, 'value'):
+        if config.get(section, 'view', fallback='buttons') == 'list':
+            output_layout = setup_section_list(container, key, config.get(section, 'action', fallback='insert'))
+            scroll_area = None
+            section_layout.addWidget(output_layout)
+        else:
+            scroll_area, output_layout = setup_section_widgets(container)
+            section_layout.addWidget(scroll_area)
+        if section_type == 'history':
+            setup_history_reader(section, output_layout, config)
+        elif seed is not None:
+            seed_section(section, output_layout, scroll_area, config, seed)
+            first_poll_delay += STARTUP_SEEDED_POLL_DELAY
+        if section_type == 'parse_command' and daemon_client is not None:
+            attach_section(section, output_layout, scroll_area, config)
+        else:
+            scheduler.add(key, partial(start_process, section, output_layout, scroll_area, config), get_section_state(config, section).interval, first_poll_delay)
+
+    elif section_type == 'clipboard':
+        scroll_area, output_layout = setup_section_widgets(container)
+        section_layout.addWidget(scroll_area)
+        history = setup_clipboard(section, output_layout, scroll_area, config, container)
+        scheduler.add(key, partial(read_clipboard_section, section, history, config), config.getint(section, 'interval'), first_poll_delay)
+
+    elif section_type == 'display' and config.get(section, 'value'):
+        display_field = setup_display_field(section, config, container)
+        display_field.setReadOnly(True)
+        display_field.setStyleSheet(DISPLAY_FIELD_STYLE)
+        display_field.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        display_field.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        display_field.verticalScrollBar().valueChanged.connect(interacted)
+        section_layout.addWidget(display_field)
+        if seed is not None:
+            seed_section(section, display_field, None, config, seed)
+            first_poll_delay += STARTUP_SEEDED_POLL_DELAY
+        if daemon_client is not None:
+            attach_section(section, display_field, None, config)
+        else:
+            scheduler.add(key, partial(update_output, section, display_field, None, config), get_section_state(config, section).interval, first_poll_delay)
+
+    elif startup_profile is not None:
+        # sections without a widget never refresh
+        startup_profile.refreshed(key)
+
+    return container
+
+section_widgets = {}
+pending_sections = deque()
+
+# builds one queued section per event loop turn so the window stays responsive while it fills in
+def build_next_section():
+    if not pending_sections:
+        return
+    config_layout, config, section, index = pending_sections.popleft()
+    # only the initial build is seeded; a hot reload rebuild always waits for a real poll
+    container = build_section(config, section, index * STARTUP_POLL_STAGGER, startup_snapshot.pop(snapshot_key(config, section), None))
+    section_widgets[section_key(config, section)] = container
+    config_layout.addWidget(container)
+    if pending_sections:
+        QTimer.singleShot(0, build_next_section)
+    elif startup_profile is not None:
+        startup_profile.mark("all sections built")
+
+# stops a section's refreshes, drops its in-flight result and removes its widgets
+def teardown_section(config, section):
+    key = section_key(config, section)
+    if key in daemon_subscriptions:
+        daemon_client.unsubscribe(daemon_subscriptions.pop(key))
+    scheduler.remove(key)
+    executor.cancel(key)
+    section_states.pop(key, None)
+    search_index.remove_section(key)
+    stored_sections.discard(key)
+    container = section_widgets.pop(key, None)
+    if container is not None:
+        config.layout.removeWidget(container)
+        container.deleteLater()
+
+# why a section cannot be built, checked before a reload tears down the running one
+def section_error(config, section):
+    try:
+        for option in config.options(section):
+            config.get(section, option)
+        if not config.has_option(section, 'type'):
+            return "missing type"
+        if not config.has_option(section, 'interval'):
+            return "missing interval"
+        config.getint(section, 'interval')
+        if config.get(section, 'type') in ('log', 'parse_command', 'history', 'display') and not config.get(section, 'value', fallback=''):
+            return "missing value"
+    except (configparser.Error, ValueError) as e:
+        return str(e)
+    return None
+
+def section_values(config):
+    return {section: dict(config.items(section, raw=True)) for section in config.sections()}
+
+# applies an edited config file in place, so unchanged sections keep their widgets, timers and output
+def reload_config(config):
+    config_watcher.addPath(os.path.abspath(config.path))
+    if not os.path.exists(config.path):
+        return
+    try:
+        new_config = configparser.ConfigParser()
+        new_config.read(config.path)
+    except configparser.Error as e:
+        print("[{}] {}".format(config.path, e), file=sys.stderr)
+        return
+    old_values = section_values(config)
+    new_values = section_values(new_config)
+    for section in new_config.sections():
+        if new_values[section] == old_values.get(section):
+            continue
+        error = section_error(new_config, section)
+        if error:
+            # keep running the old section, or leave a new one out, until the file is fixed
+            if section in old_values:
+                print("[{}] [{}] {}, keeping the running section".format(config.path, section, error), file=sys.stderr)
+                new_values[section] = old_values[section]
+            else:
+                print("[{}] [{}] {}, not adding it".format(config.path, section, error), file=sys.stderr)
+                del new_values[section]
+    if old_values == new_values:
+        return
+    changed = [section for section in old_values if old_values[section] != new_values.get(section)]
+    for section in changed:
+        teardown_section(config, section)
+    # the same ConfigParser is refilled so section keys built from id(config) stay valid
+    for section in config.sections():
+        config.remove_section(section)
+    config.defaults().clear()
+    config.defaults().update(new_config.defaults())
+    config.read_dict({section: new_values[section] for section in new_config.sections() if section in new_values}, source=config.path)
+    for section in new_values:
+        if section not in old_values or section in changed:
+            try:
+                section_widgets[section_key(config, section)] = build_section(config, section)
+            except Exception as e:
+                print("[{}] [{}] {}".format(config.path, section, e), file=sys.stderr)
+                teardown_section(config, section)
+    index = 1
+    for section in config.sections():
+        container = section_widgets.get(section_key(config, section))
+        if container is not None:
+            config.layout.removeWidget(container)
+            config.layout.insertWidget(index, container)
+            index += 1
+    removed = [section for section in changed if section not in new_values]
+    print("[{}] reloaded: {} added, {} changed, {} removed".format(
+        config.path, len(new_values.keys() - old_values.keys()), len(changed) - len(removed), len(removed)), file=sys.stderr)
+
+def schedule_config_reload(path):
+    pending_reloads.add(path)
+    config_reload_timer.start(CONFIG_RELOAD_DELAY)
+
+def reload_changed_configs():
+    if pending_sections:
+        # still building the initial sections
+        config_reload_timer.start(CONFIG_RELOAD_DELAY)
+        return
+    for config in configs:
+        if os.path.abspath(config.path) in pending_reloads:
+            reload_config(config)
+    pending_reloads.clear()
+
+pending_reloads = set()
+
+def format_metrics_table():
+    row = "{:<28} {:>5} {:>8} {:>8} {:>8} {:>8} {:>9} {:>6}"
+    lines = [row.format("section", "runs", "cmd ms", "avg cmd", "parse", "render", "bytes", "+/-")]
+    for name, metrics in sorted(section_metrics.items()):
+        lines.append(row.format(name[-28:], metrics.count,
+                                "{:.1f}".format(metrics.last('command') * 1000),
+                                "{:.1f}".format(metrics.average('command') * 1000),
+                                "{:.1f}".format(metrics.last('parse') * 1000),
+                                "{:.1f}".format(metrics.last('render') * 1000),
+                                metrics.last('bytes'),
+                                "{}/{}".format(metrics.last('added'), metrics.last('removed'))))
+    return "\n".join(lines)
+
+def toggle_metrics_overlay():
+    if metrics_overlay.isVisible():
+        metrics_overlay.hide()
+        metrics_overlay_timer.stop()
+        return
+    metrics_overlay.setGeometry(status_text_field.rect())
+    update_metrics_overlay()
+    metrics_overlay.show()
+    metrics_overlay.raise_()
+    metrics_overlay_timer.start(1000)
+
+def update_metrics_overlay():
+    metrics_overlay.setText(format_metrics_table())
+
+def metrics_json():
+    return {name: {
+        'count': metrics.count,
+        'average': {field: metrics.average(field) for field in SectionMetrics.FIELDS},
+        'samples': list(metrics.samples),
+    } for name, metrics in list(section_metrics.items())}
+
+def metrics_prometheus():
+    names = {
+        'command': ('cmd_pal_command_seconds', 'Command wall time of the last refresh.'),
+        'parse': ('cmd_pal_parse_seconds', 'Fingerprint, split and dedup time of the last refresh.'),
+        'render': ('cmd_pal_render_seconds', 'Widget update time of the last refresh.'),
+        'bytes': ('cmd_pal_output_bytes', 'Output size of the last refresh.'),
+        'added': ('cmd_pal_items_added', 'Entries added by the last refresh.'),
+        'removed': ('cmd_pal_items_removed', 'Entries removed by the last refresh.'),
+    }
+    snapshot = sorted(section_metrics.items())
+    lines = []
+    for field, (metric, help_text) in names.items():
+        lines.append("# HELP {} {}".format(metric, help_text))
+        lines.append("# TYPE {} gauge".format(metric))
+        for name, metrics in snapshot:
+            lines.append('{}{{section="{}"}} {}'.format(metric, prometheus_label(name), metrics.last(field)))
+    lines.append("# HELP cmd_pal_refreshes_total Refreshes recorded since startup.")
+    lines.append("# TYPE cmd_pal_refreshes_total counter")
+    for name, metrics in snapshot:
+        lines.append('cmd_pal_refreshes_total{{section="{}"}} {}'.format(prometheus_label(name), metrics.count))
+    return "\n".join(lines) + "\n"
+
+def prometheus_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def export_metrics(metrics_path, metrics_format):
+    if metrics_format == 'prometheus':
+        contents = metrics_prometheus()
+    else:
+        contents = json.dumps(metrics_json(), indent=2)
+    # write and rename so readers never see a half-written file
+    temporary_path = metrics_path + ".tmp"
+    with open(temporary_path, 'w') as file:
+        file.write(contents)
+    os.replace(temporary_path, metrics_path)
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def peak_memory_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# drives every section refresh back to back for a number of ticks and prints latency percentiles
+def run_benchmark(app, configs, ticks):
+    scheduler.stop()
+    app.focusChanged.disconnect(handle_focus_changed)
+    names = {}
+    for config_index, config in enumerate(configs):
+        for section in config.sections():
+            names[section_key(config, section)] = "{}/{}".format(config_index, section)
+    refreshes = dict(scheduler.entries)
+    totals = {key: [] for key in refreshes}
+    command_times = {key: [] for key in refreshes}
+    render_times = {key: [] for key in refreshes}
+    metrics = {key: get_metrics(metrics_name(config, section)) for config in configs for section in config.sections() for key in [section_key(config, section)]}
+    tick_times = []
+    spawns_before = process_spawns
+    cache_hits_before = executor.cache_hits
+    started = time.perf_counter()
+
+    for tick in range(ticks):
+        tick_started = time.perf_counter()
+        for key, entry in refreshes.items():
+            refresh_started = time.perf_counter()
+            entry.refresh()
+            while key in executor.in_flight:
+                app.processEvents(QEventLoop.AllEvents, 5)
+            app.processEvents()
+            totals[key].append(time.perf_counter() - refresh_started)
+            if key in metrics:
+                command_times[key].append(metrics[key].last('command'))
+                render_times[key].append(metrics[key].last('parse') + metrics[key].last('render'))
+        tick_times.append(time.perf_counter() - tick_started)
+
+    elapsed = time.perf_counter() - started
+    row = "{:<32} {:>5} {:>9} {:>9} {:>9} {:>9} {:>10} {:>10}"
+    print(row.format("section", "n", "p50 ms", "p95 ms", "p99 ms", "max ms", "cmd p50", "render p50"))
+    all_samples = []
+    for key, samples in totals.items():
+        all_samples.extend(samples)
+        print(row.format(names.get(key, str(key[1]))[:32], len(samples),
+                         "{:.2f}".format(percentile(samples, 0.5) * 1000),
+                         "{:.2f}".format(percentile(samples, 0.95) * 1000),
+                         "{:.2f}".format(percentile(samples, 0.99) * 1000),
+                         "{:.2f}".format(max(samples) * 1000),
+                         "{:.2f}".format(percentile(command_times[key], 0.5) * 1000),
+                         "{:.2f}".format(percentile(render_times[key], 0.5) * 1000)))
+    print(row.format("all sections", len(all_samples),
+                     "{:.2f}".format(percentile(all_samples, 0.5) * 1000),
+                     "{:.2f}".format(percentile(all_samples, 0.95) * 1000),
+                     "{:.2f}".format(percentile(all_samples, 0.99) * 1000),
+                     "{:.2f}".format(max(all_samples, default=0) * 1000), "", ""))
+    print(row.format("per tick", len(tick_times),
+                     "{:.2f}".format(percentile(tick_times, 0.5) * 1000),
+                     "{:.2f}".format(percentile(tick_times, 0.95) * 1000),
+                     "{:.2f}".format(percentile(tick_times, 0.99) * 1000),
+                     "{:.2f}".format(max(tick_times, default=0) * 1000), "", ""))
+    print()
+    print("ticks: {}  sections: {}  wall time: {:.2f}s".format(ticks, len(refreshes), elapsed))
+    print("process spawns: {} ({:.1f} per tick)".format(process_spawns - spawns_before, (process_spawns - spawns_before) / max(ticks, 1)))
+    print("shared result cache hits: {}".format(executor.cache_hits - cache_hits_before))
+    print("peak memory: {:.1f} MB".format(peak_memory_mb()))
+    return 0
 
 if __name__ == "__main__":
     default_config_path = os.path.expanduser("~/.cmd_pal/config")
@@ -363,21 +2493,86 @@ if __name__ == "__main__":
         with open(default_config_path, "w") as config_file:
             config_file.write(DEFAULT_CONFIG)
 
-    configs = [load_config(default_config_path)]
+    config_paths = [default_config_path]
+    bench = False
+    bench_ticks = 20
+    metrics_format = None
+    daemon = False
+    attach = False
 
     for i in range(1, len(sys.argv)):
         if sys.argv[i] == "-c":
             config_path = sys.argv[i + 1]
-            configs.append(load_config(config_path))
+            config_paths.append(config_path)
+        elif sys.argv[i] == "--persistent-shell":
+            shell_pool = ShellPool()
+        elif sys.argv[i] == "--headless":
+            os.environ["QT_QPA_PLATFORM"] = "offscreen"
+        elif sys.argv[i] == "--bench":
+            bench = True
+        elif sys.argv[i] == "--ticks":
+            bench_ticks = int(sys.argv[i + 1])
+        elif sys.argv[i] == "--metrics":
+            metrics_format = sys.argv[i + 1]
+        elif sys.argv[i] == "--startup-profile":
+            startup_profile = StartupProfile(process_started)
+        elif sys.argv[i] == "--daemon":
+            daemon = True
+        elif sys.argv[i] == "--attach":
+            attach = True
+
+    if daemon:
+        app = QCoreApplication([])
+        if shell_pool is not None:
+            app.aboutToQuit.connect(shell_pool.close)
+        executor = SectionExecutor()
+        scheduler = RefreshScheduler(executor)
+        next_reload_time = datetime.now()
+        if daemon_running(daemon_socket_path()):
+            print("[daemon] already running on {}".format(daemon_socket_path()), file=sys.stderr)
+            sys.exit(1)
+        poller_daemon = PollerDaemon(daemon_socket_path())
+        app.aboutToQuit.connect(poller_daemon.close)
+        print("[daemon] listening on {}".format(daemon_socket_path()), file=sys.stderr)
+        signal.signal(signal.SIGINT, lambda signum, frame: app.quit())
+        signal.signal(signal.SIGTERM, lambda signum, frame: app.quit())
+        # wakes the interpreter so the signal handlers above get to run
+        signal_timer = QTimer()
+        signal_timer.timeout.connect(lambda: None)
+        signal_timer.start(500)
+        sys.exit(app.exec())
+
+    if bench:
+        # benchmarks only run the given configs, or the shipped synthetic ones
+        config_paths = config_paths[1:]
+        if not config_paths:
+            bench_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench")
+            config_paths = sorted(os.path.join(bench_dir, name) for name in os.listdir(bench_dir) if name.endswith(".ini"))
+
+    configs = [load_config(config_path) for config_path in config_paths]
+    if not bench:
+        startup_snapshot = load_snapshot()
 
     app = QApplication([])
     app.setWindowIcon(QIcon('icon.png'))
     app.setApplicationName("CMD_PAL")
+    if startup_profile is not None:
+        startup_profile.mark("imports and app ready")
+
+    if shell_pool is not None:
+        app.aboutToQuit.connect(shell_pool.close)
+
+    executor = SectionExecutor()
+    scheduler = RefreshScheduler(executor)
+    if attach and not bench:
+        daemon_client = DaemonClient(daemon_socket_path())
 
     app.focusChanged.connect(handle_focus_changed)
     app.setStyleSheet("QWidget {background-color: #333}")
 
     window = QWidget()
+    if startup_profile is not None:
+        window.installEventFilter(startup_profile)
 
     window.setWindowTitle('CMD_PAL')
     window.setGeometry(100, 100, 20 * len(configs), 400)
@@ -391,6 +2586,24 @@ if __name__ == "__main__":
 
     main_layout.setStretch(0, 0)
 
+    search_field = QLineEdit(window)
+    search_field.setPlaceholderText("Search all sections")
+    search_field.setStyleSheet(SEARCH_FIELD_STYLE)
+    search_field.setClearButtonEnabled(True)
+    search_field.textChanged.connect(update_search_results)
+    search_field.returnPressed.connect(run_top_search_result)
+    main_layout.addWidget(search_field)
+    QShortcut(QKeySequence(SEARCH_SHORTCUT), window).activated.connect(focus_search_field)
+
+    search_results = QListWidget(window)
+    search_results.setStyleSheet(SEARCH_RESULTS_STYLE)
+    search_results.setFixedHeight(SEARCH_RESULTS_HEIGHT)
+    search_results.setMouseTracking(True)
+    search_results.itemEntered.connect(lambda result_item: update_text_field(True, result_item.data(Qt.UserRole)[0]))
+    search_results.itemClicked.connect(run_search_result)
+    search_results.hide()
+    main_layout.addWidget(search_results)
+
     config_sections_layout = QHBoxLayout()
     config_sections_layout.setContentsMargins(0,0,0,0)
     config_sections_layout.setSpacing(2)
@@ -400,77 +2613,22 @@ if __name__ == "__main__":
     reload_delay = timedelta(seconds=10)
     next_reload_time = datetime.now()
 
+    section_index = 0
     for config_index, config in enumerate(configs):
         config_layout = QVBoxLayout()
         config_layout.setSpacing(5) # sets section spacing
-        config_label = QLabel(os.path.abspath(default_config_path), window)
+        config_label = QLabel(os.path.abspath(config_paths[config_index]), window)
         config_label.setWordWrap(True)
         config_label.setStyleSheet(CONFIG_LABEL_STYLE)
 
         config_layout.addWidget(config_label)
+        config.layout = config_layout
 
         for section in config.sections():
-
-            current_section = section
-            section_type = config.get(section, 'type')
-            action = config.get(section, 'action', fallback=None)
-            if action:
-                section_label = QLabel(section + " ({})".format(action), window)
-            else:
-                section_label = QLabel(section, window)
-            section_label.setStyleSheet(SECTION_LABEL_STYLE)
-            section_label.setWordWrap(True)
-            spacer_item = QSpacerItem(0, 10, QSizePolicy.Minimum, QSizePolicy.Fixed)
-            config_layout.addItem(spacer_item)
-            config_layout.addWidget(section_label)
-
-           
-
-            if section_type == 'log':
-                file_contents_field = QTextEdit(window)
-                file_contents_field.setReadOnly(True)
-                file_contents_field.setStyleSheet(FILE_CONTENTS_FIELD_STYLE)
-                file_contents_field.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-                file_contents_field.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-                config_layout.addWidget(file_contents_field)
-
-                input_field = CustomTextEdit(window)
-                input_field.setFixedHeight(CUSTOM_TEXT_EDIT_HEIGHT)
-                input_field.setStyleSheet(INPUT_FIELD_STYLE)
-                config_layout.addWidget(input_field)
-                file_contents_field.verticalScrollBar().valueChanged.connect(interacted)
-                spacer_item = QSpacerItem(0, 5, QSizePolicy.Minimum, QSizePolicy.Fixed)
-                config_layout.addItem(spacer_item)
-                submit_button = QPushButton("ADD", window)
-                submit_button.setStyleSheet(SUBMIT_BUTTON_STYLE)
-                submit_button.clicked.connect(partial(append_to_file, section, input_field, file_contents_field, config))
-                config_layout.addWidget(submit_button)
-                QTimer.singleShot(0, partial(update_file_contents, section, file_contents_field, config))
-                timer = QTimer(window)
-                timer.timeout.connect(partial(handle_file_timer, section, file_contents_field, config))
-                timer.start(config.getint(section, 'interval') * 1000)
-
-            elif section_type == 'parse_command' and config.get(section, 'value'):
-                scroll_area, output_layout = setup_section_widgets(window)
-                config_layout.addWidget(scroll_area)
-                QTimer.singleShot(0, partial(start_process, section, output_layout, scroll_area, config))
-                timer = QTimer(window)
-                timer = QTimer(window)
-                timer.timeout.connect(partial(handle_timer, section, output_layout, scroll_area, config, timer))
-                timer.start(config.getint(section, 'interval') * 1000)
-
-            elif section_type == 'display' and config.get(section, 'value'):
-                display_field = QTextEdit(window)
-                display_field.setReadOnly(True)
-                display_field.setStyleSheet(DISPLAY_FIELD_STYLE)
-                display_field.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-                display_field.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-                display_field.verticalScrollBar().valueChanged.connect(interacted)
-                config_layout.addWidget(display_field)
-                QTimer.singleShot(0, partial(update_output, section, display_field, None, config))
-                timer = QTimer(window)
-                timer.timeout.connect(partial(update_output, section, display_field, None, config))
-                timer.start(config.getint(section, 'interval') * 1000)
+            pending_sections.append((config_layout, config, section, section_index))
+            if startup_profile is not None:
+                startup_profile.expect(section_key(config, section))
+            section_index += 1
 
         config_sections_layout.addLayout(config_layout)
 
@@ -482,16 +2640,62 @@ if __name__ == "__main__":
     spacer = QSpacerItem(0, 0, QSizePolicy.Minimum, QSizePolicy.Expanding)
     main_layout.addItem(spacer)
 
+    jobs_list = QListWidget(window)
+    jobs_list.setStyleSheet(JOBS_LIST_STYLE)
+    jobs_list.setFixedHeight(JOBS_LIST_HEIGHT)
+    jobs_list.itemClicked.connect(stop_job_item)
+    jobs_list.jobs = []
+    jobs_list.hide()
+    main_layout.addWidget(jobs_list)
+
     status_text_field = QTextEdit(window)
     status_text_field.setFixedHeight(STATUS_FIELD_HEIGHT)
     status_text_field.setStyleSheet(STATUS_FIELD_STYLE)
+    status_text_field.document().setMaximumBlockCount(RUN_OUTPUT_MAX_LINES)
     main_layout.addWidget(status_text_field)
+    run_output_timer = QTimer(window)
+    run_output_timer.setSingleShot(True)
+    run_output_timer.timeout.connect(flush_run_output)
+    app.aboutToQuit.connect(stop_all_command_threads)
+
+    metrics_overlay = QLabel(status_text_field)
+    metrics_overlay.setStyleSheet(METRICS_OVERLAY_STYLE)
+    metrics_overlay.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+    metrics_overlay.setAttribute(Qt.WA_TransparentForMouseEvents)
+    metrics_overlay.hide()
+    metrics_overlay_timer = QTimer(window)
+    metrics_overlay_timer.timeout.connect(update_metrics_overlay)
+    QShortcut(QKeySequence(METRICS_OVERLAY_SHORTCUT), window).activated.connect(toggle_metrics_overlay)
+
+    if metrics_format:
+        metrics_path = os.path.expanduser("~/.cmd_pal/metrics.{}".format('prom' if metrics_format == 'prometheus' else 'json'))
+        metrics_export_timer = QTimer(window)
+        metrics_export_timer.timeout.connect(partial(export_metrics, metrics_path, metrics_format))
+        metrics_export_timer.start(METRICS_EXPORT_INTERVAL * 1000)
+        app.aboutToQuit.connect(partial(export_metrics, metrics_path, metrics_format))
 
     window.setWindowTitle("CMD_PAL")
     window.setLayout(main_layout)
     window.setGeometry(0, 100, 300 * len(configs), 1000)
     window.show()
     window.original_pos = window.pos()
+    app.aboutToQuit.connect(lambda: command_store is not None and command_store.close())
+    if startup_profile is not None:
+        startup_profile.mark("window shown")
+
+    if bench:
+        while pending_sections:
+            build_next_section()
+        sys.exit(run_benchmark(app, configs, bench_ticks))
+
+    app.aboutToQuit.connect(partial(save_snapshot, configs))
+    QTimer.singleShot(0, build_next_section)
+
+    config_reload_timer = QTimer()
+    config_reload_timer.setSingleShot(True)
+    config_reload_timer.timeout.connect(reload_changed_configs)
+    config_watcher = QFileSystemWatcher([os.path.abspath(config.path) for config in configs])
+    config_watcher.fileChanged.connect(schedule_config_reload)
 
     try:
       sys.exit(app.exec())